@@ -745,10 +745,65 @@ class ProgOptions(Subframe):
                       "folder will be several times larger!",
                  justify=tk.LEFT,
                  padx=20).pack()
+
+        self.read_compressed = tk.IntVar()
+        self.read_compressed.set(0)
+
+        tk.Checkbutton(frame, text='Read compressed input directly',
+                       variable=self.read_compressed,
+                       onvalue=1, offvalue=0).pack(anchor=tk.W)
+        tk.Label(frame,
+                 text="Only for demultiplexed paired reads without spike removal:\n"
+                      "the .fastq.gz files are not decompressed first, so usearch\n"
+                      "reads them directly and 2bpaired.tab lists the .gz files.",
+                 justify=tk.LEFT,
+                 padx=20).pack()
+
+        self.quality_profiles = tk.IntVar()
+        self.quality_profiles.set(0)
+
+        tk.Checkbutton(frame, text='Compute quality profiles',
+                       variable=self.quality_profiles,
+                       onvalue=1, offvalue=0).pack(anchor=tk.W)
+        tk.Label(frame,
+                 text="Writes per sample quality profiles to the qc folder.\n"
+                      "Reads every input file once more on this computer\n"
+                      "before the analysis starts (about 65 MB/s per core).",
+                 justify=tk.LEFT,
+                 padx=20).pack()
+
+        self.subsample_fraction = tk.StringVar()
+        self.subsample_fraction.set('1')
+        tk.Label(frame,
+                 text="Fraction of reads to analyse for a quick test run\n"
+                      "of demultiplexed reads (default=1=all reads,\n"
+                      "e.g. 0.01 for 1% of the reads):",
+                 justify=tk.LEFT).pack()
+        tk.Entry(frame,
+                 width=6,
+                 textvariable=self.subsample_fraction,
+                 validate='key',
+                 validatecommand=(frame.register(IMNGSAdvancedOptions.validate_between_0_and_1), '%d', '%i', '%P',
+                                  '%s', '%S', '%v', '%V', '%W')).pack()
         self.frame.pack()
 
     def on_next(self):
         self.master.values['cleanoutput'] = int(self.clean_output.get())
+        self.master.values['read_compressed'] = int(self.read_compressed.get())
+        self.master.values['quality_profiles'] = int(self.quality_profiles.get())
+
+        subsample_fraction = float(self.subsample_fraction.get() if self.subsample_fraction.get() != '' else 1)
+        if not 0 < subsample_fraction <= 1:
+            messagebox.showerror("Invalid fraction of reads",
+                                 "The fraction of reads to analyse must be greater than 0 and at most 1.")
+            raise DenyNextSubframe
+        if subsample_fraction < 1 and self.master.values['run_demux'] == 1:
+            messagebox.showerror("Subsampling not available",
+                                 "Only already demultiplexed reads can be subsampled. "
+                                 "Please set the fraction of reads to 1 or skip demultiplexing.")
+            raise DenyNextSubframe
+        self.master.values['subsample_fraction'] = subsample_fraction
+        logging.info(f"Program Options: subsample_fraction={self.master.values['subsample_fraction']}")
 
 
 def execute_pipeline(pl):
@@ -845,8 +900,23 @@ class Run(Subframe):
         # try to mount network shares; allowed to fail with non network drives
         pl.add_work(Mount(self.master.driver, path_containing_fastq_folder))
 
-        # unzip files in folder; needing Linux commands, so attach a fitting driver
-        pl.add_work(GunzipPump(self.master.driver, os.path.join(working_dir, 'fastq'), keep_gz_files=False))
+        if self.master.values.get('quality_profiles', 0) == 1:
+            # profile read quality of the input files before the analysis starts
+            pl.add_work(QualityProfilePump(self.master.driver, os.path.join(working_dir, 'fastq'),
+                                           os.path.join(self.master.values['outpath'], 'qc')))
+
+        subsample_fraction = self.master.values.get('subsample_fraction', 1)
+        if subsample_fraction < 1 and self.master.values['run_demux'] == 0:
+            # analyse an uncompressed subsample of the reads in a separate folder
+            subsample_dir = os.path.join(self.master.values['outpath'], 'subsample')
+            pl.add_work(SubsamplePump(self.master.driver, os.path.join(working_dir, 'fastq'), subsample_dir,
+                                      fraction=subsample_fraction))
+            working_dir = subsample_dir
+        elif not (self.master.values.get('read_compressed', 0) == 1 and self.master.values['run_demux'] == 0
+                  and self.master.values['run_spike_removal'] == 0 and self.master.values['isPaired'] == 1):
+            # unzip files in folder; needing Linux commands, so attach a fitting driver
+            # on request demultiplexed paired reads are counted and merged directly from .fastq.gz files
+            pl.add_work(GunzipPump(self.master.driver, os.path.join(working_dir, 'fastq'), keep_gz_files=False))
 
         if self.master.values['run_spike_removal'] == 1:
             # remove spikes
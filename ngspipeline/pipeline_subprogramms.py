@@ -56,23 +56,106 @@ class Umount(Pump):
         linAtWin.log_output(self.driver.run_cmd(cmd))
 
 
+class QualityProfilePump(Pump):
+    """Compute a quality control profile of every read file before the analysis.
+    Runs in-process on the host; compressed files are read directly.  This reads
+    every input file once more (about 65 MB/s per worker), so the GUI only adds
+    this pump on request.  Samples whose file cannot be read are logged and
+    skipped.
+    """
+
+    def __init__(self, driver: linAtWin.Driver, directory: str, output_directory: str, workers: int = None):
+        super().__init__()
+        self.driver = driver
+        self.directory = directory
+        self.output_directory = output_directory
+        self.workers = workers
+        self.samples = {}
+
+    def prepare(self):
+        try:
+            import ngssdk.stats
+        except ImportError:
+            raise SkipRest("NumPy is not installed. Skipping quality profiles.")
+
+        self.samples = ngssdk.stats.collect_fastq_files(self.directory)
+        if len(self.samples) < 1:
+            raise SkipRest("No quality profiles needed. No illumina read files found.")
+
+    def run(self):
+        import ngssdk.stats
+
+        print(f'Exec {self.__class__.__name__}')
+        linAtWin.log_output(self.driver.run_cmd('set_status.py "Computing quality profiles"'))
+        os.makedirs(self.output_directory, exist_ok=True)
+
+        profiles = ngssdk.stats.profile_files(self.samples, workers=self.workers, skip_errors=True)
+        for sample, profile in profiles.items():
+            ngssdk.stats.write_profile(sample, profile, self.output_directory)
+        ngssdk.stats.write_summary(profiles, os.path.join(self.output_directory, 'qc_summary.tab'))
+        logging.info(f'Wrote quality profiles of {len(profiles)} files to {self.output_directory}')
+
+
+class SubsamplePump(Pump):
+    """Write a reproducible subsample of every read file (pair) to
+    output_directory/fastq for quick parameter exploration runs.
+    Runs in-process on the host; compressed files are read directly and the
+    subsample is written uncompressed.
+    """
+
+    def __init__(self, driver: linAtWin.Driver, directory: str, output_directory: str, fraction: float = None,
+                 reads: int = None, seed: int = 0, workers: int = None):
+        super().__init__()
+        self.driver = driver
+        self.directory = directory
+        self.output_directory = output_directory
+        self.fraction = fraction
+        self.reads = reads
+        self.seed = seed
+        self.workers = workers
+
+    def prepare(self):
+        if len(ngssdk.find_read_files(self.directory)) < 1:
+            logging.error("No input files for subsampling")
+            raise ExecutionFailed
+
+    def run(self):
+        print(f'Exec {self.__class__.__name__}')
+        linAtWin.log_output(self.driver.run_cmd('set_status.py "Subsampling reads"'))
+
+        counts = ngssdk.subsample_directory(self.directory, os.path.join(self.output_directory, 'fastq'),
+                                            reads=self.reads, fraction=self.fraction, seed=self.seed,
+                                            workers=self.workers)
+        for path, count in sorted(counts.items()):
+            logging.info(f'Subsample: {count} reads in {path}')
+
+
 class GunzipPump(Pump):
-    def __init__(self, driver: linAtWin.Driver, directory: str, keep_gz_files=True):
+    """Decompress the .fastq.gz files of a directory in parallel inside the WSL.
+    Files are written via a temporary name and files with a complete
+    decompressed version (size and CRC32 of the gzip trailer) are skipped.
+    prepare only compares sizes and modification times, so the decompressed
+    files are not read over the share; the CRC32 check is left to the WSL.
+    """
+
+    def __init__(self, driver: linAtWin.Driver, directory: str, keep_gz_files=True, workers: int = None):
         super().__init__()
         self.driver = driver
         self.directory = directory
         self.keep_gz_files = keep_gz_files
+        self.workers = workers
 
     def prepare(self):
         number_of_gzipped_illumina_files = ngssdk.count_files(self.directory, accepted_extensions=('.gz',),
                                                               validator=ngssdk.has_illumina_read_naming_scheme)
-        if number_of_gzipped_illumina_files < 1 or ngssdk.each_file_has_decompressed_version(self.directory):
+        if number_of_gzipped_illumina_files < 1 or \
+                ngssdk.each_file_has_decompressed_version(self.directory, verify=False):
             # we dont need to run
             raise SkipRest("No gunzip needed. No gzipped files found or files already unzipped.")
 
     def run(self):
         print(f'Exec {self.__class__.__name__}')
-        self.driver.run_cmd('set_status.py "Decompressing files"')
+        linAtWin.log_output(self.driver.run_cmd('set_status.py "Decompressing files"'))
         self.gunzip(keep=self.keep_gz_files)
 
         if not self.driver.success:
@@ -83,20 +166,32 @@ class GunzipPump(Pump):
             raise ExecutionFailed
 
     def gunzip(self, keep=True):
-        keep_flag = "-k " if keep else ""
-        path = self.directory
-        input_folder = wsl_compatible_path(path)
+        remove_flag = "" if keep else " --remove"
+        workers_flag = f" --workers {self.workers}" if self.workers else ""
+        input_folder = wsl_compatible_path(self.directory)
 
-        cmd = f'gunzip -f {keep_flag}{input_folder}/*.fastq.gz'
+        cmd = f'gunzip_parallel.py "{input_folder}" --status{remove_flag}{workers_flag}'
         print(cmd)
         linAtWin.log_output(self.driver.run_cmd(cmd))
 
 
 class SpikeRemovalPump(Pump):
-    def __init__(self, driver: linAtWin.Driver, directory: str, mapping_file: str):
+    """Remove spike-in reads with bowtie2 inside the WSL.
+    cores limits the cores used by all bowtie2 runs together, threads fixes the
+    threads per bowtie2 run; by default all cores are used and split over the
+    samples, largest sample first.
+    screen selects the k-mer pre-screen of rm_spikes.py ('off', 'prefilter' or
+    'fast'); it is off unless set.
+    """
+
+    def __init__(self, driver: linAtWin.Driver, directory: str, mapping_file: str, cores: int = None,
+                 threads: int = None, screen: str = None):
         super().__init__()
         self.driver = driver
         self.directory = directory
+        self.cores = cores
+        self.threads = threads
+        self.screen = screen
 
         self.spikes_ref = None
         self.mapping_file = mapping_file
@@ -131,6 +226,12 @@ class SpikeRemovalPump(Pump):
         cmd = ["rm_spikes.py", spikes_ref, mapping_file,
                input_folder, out_samples, out_spikes,
                out_file_stats, out_file_reduced_mapping]
+        if self.cores:
+            cmd += ["--cores", str(self.cores)]
+        if self.threads:
+            cmd += ["--threads", str(self.threads)]
+        if self.screen:
+            cmd += ["--screen", self.screen]
         linAtWin.log_output(self.driver.run_cmd(' '.join(cmd)))
 
         if not self.driver.success:
@@ -1,4 +1,18 @@
+"""Methods to read, check and process the sequencing files of the pipeline.
+
+The standard library modules are imported here.  quality, stats, spikes and
+otutable require NumPy and are therefore not imported by `import ngssdk`;
+import them directly, e.g. `from ngssdk.stats import profile_fastq`.
+"""
+
 from ngssdk.checks import *
+from ngssdk.compression import *
 from ngssdk.custom_exceptions import *
+from ngssdk.fasta import *
 from ngssdk.fastq import *
 from ngssdk.filename_manipulations import *
+from ngssdk.index import *
+from ngssdk.parallel import *
+from ngssdk.subsample import *
+from ngssdk.taxonomy import *
+from ngssdk.merge import *
@@ -1,6 +1,8 @@
 import os
 from typing import Callable, Iterable
 
+from ngssdk.compression import is_decompressed_version, may_be_decompressed_version
+
 """Methods to check assumptions about folders."""
 
 
@@ -25,20 +27,19 @@ def file_matches(file: str, accepted_extensions: Iterable[str],
     return False
 
 
-def each_file_has_decompressed_version(directory):
-    compressed = []
-    fastq = []
-    for node in os.listdir(directory):
-        if os.path.isfile(os.path.join(directory, node)):
-            if node.endswith(".fastq.gz"):
-                compressed.append(node[:-9])
-            elif node.endswith(".fastq"):
-                fastq.append(node[:-6])
-    compressed.sort()
-    fastq.sort()
-
-    if len(compressed) == 0:
-        # no compressed files
-        return True
-
-    return compressed == fastq
+def each_file_has_decompressed_version(directory: str, verify: bool = True) -> bool:
+    """Check if every .fastq.gz file of a directory has a .fastq sibling.
+    With verify the siblings must match sizes and CRC32s of the gzip trailers,
+    so partially decompressed files are not accepted.  Without verify only
+    size and modification time are compared, which needs no reading of the
+    decompressed files.
+    """
+    is_complete = is_decompressed_version if verify else may_be_decompressed_version
+    nodes = set(os.listdir(directory))
+    for node in nodes:
+        if node.endswith(".fastq.gz") and os.path.isfile(os.path.join(directory, node)):
+            if node[:-3] not in nodes:
+                return False
+            if not is_complete(os.path.join(directory, node), os.path.join(directory, node[:-3])):
+                return False
+    return True
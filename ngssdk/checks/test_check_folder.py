@@ -1,3 +1,6 @@
+import gzip
+import os
+import tempfile
 from unittest import TestCase
 from ngssdk.checks.check_folder import *
 
@@ -7,3 +10,23 @@ class Test(TestCase):
         self.assertTrue(file_matches("abc.fastq", accepted_extensions=('.fastq',), validator=validator))
         self.assertFalse(file_matches("abc.fastq", accepted_extensions=('.fq',), validator=validator))
         self.assertFalse(file_matches("bc.fastq", accepted_extensions=('.fastq',), validator=validator))
+
+    def test_each_file_has_decompressed_version(self):
+        with tempfile.TemporaryDirectory() as directory:
+            data = b"@r\nACGT\n+\nIIII\n" * 100
+            with open(os.path.join(directory, "a.fastq.gz"), "wb") as handle:
+                handle.write(gzip.compress(data))
+            self.assertFalse(each_file_has_decompressed_version(directory))
+            with open(os.path.join(directory, "a.fastq"), "wb") as handle:
+                handle.write(data[:-5])
+            self.assertFalse(each_file_has_decompressed_version(directory))
+            self.assertFalse(each_file_has_decompressed_version(directory, verify=False))
+            with open(os.path.join(directory, "a.fastq"), "wb") as handle:
+                handle.write(data[:-5] + b"IIIII")
+            self.assertFalse(each_file_has_decompressed_version(directory))
+            self.assertTrue(each_file_has_decompressed_version(directory, verify=False))
+            os.utime(os.path.join(directory, "a.fastq"), (0, 0))
+            self.assertFalse(each_file_has_decompressed_version(directory, verify=False))
+            with open(os.path.join(directory, "a.fastq"), "wb") as handle:
+                handle.write(data)
+            self.assertTrue(each_file_has_decompressed_version(directory))
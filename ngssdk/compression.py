@@ -0,0 +1,286 @@
+"""Methods to read gzip and bgzip compressed files as a stream."""
+
+import concurrent.futures
+import io
+import os
+import queue
+import struct
+import threading
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+GZIP_MAGIC: bytes = b"\x1f\x8b"
+
+# The empty block that terminates bgzip files.
+BGZF_EOF: bytes = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+# Number of compressed bytes read at once when inflating a plain gzip stream.
+DEFAULT_READ_SIZE: int = 1024 * 1024
+
+# Number of decompressed blocks the background thread may read ahead.
+DEFAULT_QUEUE_SIZE: int = 16
+
+_GZIP_WBITS: int = 16 + zlib.MAX_WBITS
+_FLAG_EXTRA: int = 0x04
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """Detect the compression of a file by its magic bytes.
+    Return "bgzf" for blocked gzip (bgzip) files, "gzip" for other gzip files
+    and None for uncompressed files.
+    """
+    with open(path, "rb") as handle:
+        header: bytes = handle.read(16)
+    if not header.startswith(GZIP_MAGIC):
+        return None
+    if len(header) == 16 and header[3] & _FLAG_EXTRA and header[12:14] == b"BC":
+        return "bgzf"
+    return "gzip"
+
+
+def gzip_trailer(path: str) -> Tuple[int, int]:
+    """Return CRC32 and size modulo 2**32 of the uncompressed data of the last
+    gzip member of a file.  The empty end-of-file block of bgzip files is skipped.
+    """
+    with open(path, "rb") as handle:
+        handle.seek(0, os.SEEK_END)
+        size: int = handle.tell()
+        handle.seek(max(0, size - len(BGZF_EOF) - 8))
+        tail: bytes = handle.read()
+    if tail.endswith(BGZF_EOF) and len(tail) == len(BGZF_EOF) + 8:
+        tail = tail[:8]
+    if len(tail) < 8:
+        raise EOFError(f"{path} is too short to be a gzip file")
+    return struct.unpack("<II", tail[-8:])
+
+
+def bgzf_trailers(path: str) -> List[Tuple[int, int]]:
+    """Return CRC32 and uncompressed size of every member of a bgzip file.
+    Only the block headers and trailers are read.
+    """
+    trailers = []
+    with open(path, "rb") as handle:
+        while True:
+            header = _read_bgzf_header(handle)
+            if header is None:
+                return trailers
+            handle.seek(header[1] - len(header[0]) - 8, os.SEEK_CUR)
+            trailer: bytes = handle.read(8)
+            if len(trailer) != 8:
+                raise EOFError("Compressed file ended before the end of a bgzf block was reached")
+            trailers.append(struct.unpack("<II", trailer))
+
+
+def is_decompressed_version(compressed_path: str, path: str, read_size: int = DEFAULT_READ_SIZE) -> bool:
+    """Check if path holds the complete decompressed content of a gzip file.
+    The decompressed file is compared with size and CRC32 of every member of
+    a bgzip file.  Members of other gzip files can only be found by inflating
+    them, so these are taken as one member: multi-member gzip files are never
+    verified and have to be decompressed again.  Nothing is inflated.
+    """
+    if not os.path.isfile(path):
+        return False
+    size: int = os.path.getsize(path)
+    if detect_compression(compressed_path) == "bgzf":
+        members = bgzf_trailers(compressed_path)
+        if sum(isize for _, isize in members) != size:
+            return False
+    else:
+        crc, isize = gzip_trailer(compressed_path)
+        if size % (1 << 32) != isize:
+            return False
+        members = [(crc, size)]
+    with open(path, "rb") as handle:
+        for crc, isize in members:
+            checksum: int = 0
+            while isize:
+                data: bytes = handle.read(min(read_size, isize))
+                if not data:
+                    return False
+                checksum = zlib.crc32(data, checksum)
+                isize -= len(data)
+            if checksum != crc:
+                return False
+    return True
+
+
+def may_be_decompressed_version(compressed_path: str, path: str) -> bool:
+    """A quick check for is_decompressed_version that only reads the gzip
+    trailers: path must not be older than the gzip file and its size must
+    equal the uncompressed size from the trailer, or the sum over all blocks
+    of a bgzip file.  The content of path is not read.
+    """
+    if not os.path.isfile(path) or os.path.getmtime(path) < os.path.getmtime(compressed_path):
+        return False
+    size: int = os.path.getsize(path)
+    if detect_compression(compressed_path) == "bgzf":
+        return size == sum(isize for _, isize in bgzf_trailers(compressed_path))
+    return size % (1 << 32) == gzip_trailer(compressed_path)[1]
+
+
+def open_decompressed(path: str, threads: Optional[int] = None) -> BinaryIO:
+    """Open a file for reading in binary mode and transparently decompress it.
+    The compression is detected by magic bytes.  Compressed files are inflated
+    in a background thread; for bgzip files up to `threads` blocks are inflated
+    in parallel.  Uncompressed files are opened directly.
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, "rb")
+
+    handle = open(path, "rb")
+    if compression == "bgzf":
+        blocks = _iter_bgzf_blocks(handle, threads or os.cpu_count() or 1)
+    else:
+        blocks = _iter_gzip_blocks(handle)
+    return io.BufferedReader(BackgroundReader(blocks, on_close=handle.close), buffer_size=DEFAULT_READ_SIZE)
+
+
+class BackgroundReader(io.RawIOBase):
+    """A read-only raw stream over blocks of bytes produced in a background thread.
+    The producing iterator runs in a daemon thread and may read ahead up to
+    queue_size blocks.  Exceptions raised by the producer are re-raised on read.
+    """
+
+    _END = object()
+
+    def __init__(self, blocks: Iterator[bytes], queue_size: int = DEFAULT_QUEUE_SIZE, on_close=None):
+        super().__init__()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._on_close = on_close
+        self._current: memoryview = memoryview(b"")
+        self._exhausted = False
+        self._thread = threading.Thread(target=self._produce, args=(blocks,), daemon=True)
+        self._thread.start()
+
+    def _produce(self, blocks: Iterator[bytes]):
+        try:
+            for block in blocks:
+                if not self._put(block):
+                    return
+            self._put(self._END)
+        except BaseException as e:
+            self._put(e)
+        finally:
+            if hasattr(blocks, "close"):
+                blocks.close()
+
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current and not self._exhausted:
+            item = self._queue.get()
+            if item is self._END:
+                self._exhausted = True
+            elif isinstance(item, BaseException):
+                self._exhausted = True
+                raise item
+            else:
+                self._current = memoryview(item)
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stopped.set()
+            self._thread.join()
+            if self._on_close is not None:
+                self._on_close()
+        super().close()
+
+
+def _iter_gzip_blocks(handle: BinaryIO, read_size: int = DEFAULT_READ_SIZE) -> Iterator[bytes]:
+    """Inflate a gzip stream consisting of one or more members."""
+    decompressor = zlib.decompressobj(_GZIP_WBITS)
+    in_member = False
+    while True:
+        data: bytes = handle.read(read_size)
+        if not data:
+            break
+        while data:
+            if not in_member and not data.strip(b"\x00"):
+                # zero padding after the last member
+                break
+            in_member = True
+            block = decompressor.decompress(data)
+            if block:
+                yield block
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(_GZIP_WBITS)
+                in_member = False
+            else:
+                data = b""
+    if in_member:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+
+def _read_bgzf_header(handle: BinaryIO) -> Optional[Tuple[bytes, int]]:
+    """Read the header of a bgzf member (a gzip member with a BC extra subfield).
+    Return the header including the extra field and the size of the whole
+    member, or None at the end of the file.
+    """
+    header: bytes = handle.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or not header.startswith(GZIP_MAGIC) or not header[3] & _FLAG_EXTRA:
+        raise EOFError("Invalid or truncated bgzf block header")
+    extra_length: int = struct.unpack("<H", header[10:12])[0]
+    extra: bytes = handle.read(extra_length)
+
+    position = 0
+    while position + 4 <= len(extra):
+        subfield_length: int = struct.unpack("<H", extra[position + 2:position + 4])[0]
+        if extra[position:position + 2] == b"BC" and subfield_length == 2:
+            return header + extra, struct.unpack("<H", extra[position + 4:position + 6])[0] + 1
+        position += 4 + subfield_length
+    raise EOFError("bgzf block without BC subfield")
+
+
+def _read_bgzf_member(handle: BinaryIO) -> bytes:
+    """Read one complete bgzf member."""
+    header = _read_bgzf_header(handle)
+    if header is None:
+        return b""
+    remaining: int = header[1] - len(header[0])
+    rest: bytes = handle.read(remaining)
+    if len(rest) != remaining:
+        raise EOFError("Compressed file ended before the end of a bgzf block was reached")
+    return header[0] + rest
+
+
+def _inflate_member(member: bytes) -> bytes:
+    return zlib.decompress(member, _GZIP_WBITS)
+
+
+def _iter_bgzf_blocks(handle: BinaryIO, threads: int) -> Iterator[bytes]:
+    """Inflate bgzf members in parallel, yielding them in file order.
+    zlib releases the GIL while inflating, so threads run truly parallel.
+    """
+    batch_size: int = threads * 4
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            batch = []
+            for _ in range(batch_size):
+                member = _read_bgzf_member(handle)
+                if not member:
+                    break
+                batch.append(member)
+            if not batch:
+                return
+            for block in executor.map(_inflate_member, batch):
+                if block:
+                    yield block
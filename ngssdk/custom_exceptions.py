@@ -1,2 +1,14 @@
 class WrongFileType(Exception):
     pass
+
+
+class FastqFormatError(Exception):
+    pass
+
+
+class FastaFormatError(Exception):
+    pass
+
+
+class OtuTableFormatError(Exception):
+    pass
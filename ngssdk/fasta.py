@@ -0,0 +1,140 @@
+"""Methods to read and write fasta files with usearch style annotations."""
+
+import collections
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from ngssdk.compression import open_decompressed
+from ngssdk.custom_exceptions import FastaFormatError
+from ngssdk.fastq import DEFAULT_CHUNK_SIZE
+
+# Number of records joined into one write by write_fasta.
+DEFAULT_WRITE_BATCH: int = 10_000
+
+
+class FastaRecord(collections.namedtuple('FastaRecord', ['id', 'sequence'])):
+    """A fasta record of undecoded bytes.  The id is the full header line
+    without the leading '>', including annotations like ';size=12;'.
+    """
+    __slots__ = ()
+
+    @property
+    def label(self) -> bytes:
+        """The id up to the first ';' or whitespace."""
+        parts = self.id.split(b";", 1)[0].split(None, 1)
+        return parts[0] if parts else b""
+
+    @property
+    def size(self) -> Optional[int]:
+        return size_annotation(self.id)
+
+    @property
+    def barcodelabel(self) -> Optional[bytes]:
+        return annotation(self.id, b"barcodelabel")
+
+
+def annotation(header: bytes, key: bytes) -> Optional[bytes]:
+    """Return the value of a usearch style 'key=value;' annotation of a header
+    or None if the header has no such annotation.
+    """
+    start = header.find(b";" + key + b"=")
+    if start < 0:
+        return None
+    start += len(key) + 2
+    end = header.find(b";", start)
+    return header[start:] if end < 0 else header[start:end]
+
+
+def size_annotation(header: bytes) -> Optional[int]:
+    """Return the ';size=N;' annotation of a header as int or None."""
+    value = annotation(header, b"size")
+    return None if value is None else int(value)
+
+
+def iter_fasta(path) -> Iterator[FastaRecord]:
+    """Iterate over the records of a (possibly compressed) fasta file."""
+    with open_decompressed(path) as handle:
+        yield from iter_fasta_from_binary_handle(handle)
+
+
+def iter_fasta_from_binary_handle(handle: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[FastaRecord]:
+    """Parse fasta records from a handle opened in binary mode.
+    Sequences may span multiple lines.  The handle is read in chunks which are
+    split on record starts ('\\n>') without decoding.
+    """
+    leftover: bytes = b""
+    first = True
+    while True:
+        chunk: bytes = handle.read(chunk_size)
+        buffer: bytes = leftover + chunk
+        if first:
+            buffer = buffer.lstrip(b"\r\n")
+            if not buffer:
+                if not chunk:
+                    return
+                continue
+            if not buffer.startswith(b">"):
+                raise FastaFormatError(f"Fasta file does not start with '>': {buffer[:50]!r}")
+            first = False
+            buffer = buffer[1:]
+
+        entries = buffer.split(b"\n>")
+        if chunk:
+            # the last entry may continue in the next chunk
+            leftover = entries.pop()
+        for entry in entries:
+            header, _, sequence = entry.partition(b"\n")
+            yield FastaRecord(header.rstrip(b"\r"), sequence.replace(b"\n", b"").replace(b"\r", b""))
+        if not chunk:
+            return
+
+
+def format_fasta(records: Iterable, line_width: Optional[int] = None) -> bytes:
+    """Format records with id and sequence (bytes) as fasta.  Sequences are
+    wrapped after line_width characters if given.
+    """
+    if not line_width:
+        return b"".join(b">%s\n%s\n" % (record.id, record.sequence) for record in records)
+    parts = []
+    for record in records:
+        parts.append(b">%s\n" % record.id)
+        sequence = record.sequence
+        parts.extend(sequence[i:i + line_width] + b"\n" for i in range(0, len(sequence), line_width))
+    return b"".join(parts)
+
+
+def write_fasta(handle: BinaryIO, records: Iterable, line_width: Optional[int] = None,
+                batch_size: int = DEFAULT_WRITE_BATCH) -> int:
+    """Write records to a binary handle in batches of batch_size records.
+    Return the number of written records.
+    """
+    count: int = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            handle.write(format_fasta(batch, line_width))
+            count += len(batch)
+            batch = []
+    handle.write(format_fasta(batch, line_width))
+    return count + len(batch)
+
+
+def select_fasta(input_path: str, output_path: str, ids: Iterable[bytes]) -> int:
+    """Copy the records whose id up to the first whitespace is in ids.
+    Return the number of selected records.
+    """
+    wanted = frozenset(ids)
+    with open(output_path, "wb") as handle:
+        return write_fasta(handle, (record for record in iter_fasta(input_path)
+                                    if (record.id.split(None, 1) or [b""])[0] in wanted))
+
+
+def trim_fasta(input_path: str, output_path: str, forward_trim: int = 0, reverse_trim: int = 0) -> int:
+    """Copy all records with forward_trim bases removed from the start and
+    reverse_trim bases removed from the end of each sequence.
+    Return the number of written records.
+    """
+    with open(output_path, "wb") as handle:
+        records = (FastaRecord(record.id, record.sequence[forward_trim:max(0, len(record.sequence) - reverse_trim)])
+                   for record in iter_fasta(input_path))
+        return write_fasta(handle, records)
@@ -0,0 +1,152 @@
+"""A sidecar offset index (.fqi) for uncompressed fastq files.
+
+The index stores the record count and the byte offset of every k-th record,
+stamped with the size and modification time of the indexed file.  It allows
+to get record counts without a rescan and to seek to any record while reading
+at most k - 1 records.
+"""
+
+import array
+import itertools
+import logging
+import os
+import struct
+import sys
+from typing import BinaryIO, Iterator, Optional
+
+from ngssdk.compression import detect_compression
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import DEFAULT_CHUNK_SIZE, FastqRecord, iter_fastq_from_binary_handle
+
+INDEX_EXTENSION: str = ".fqi"
+
+# Every DEFAULT_INTERVAL-th record offset is stored.
+DEFAULT_INTERVAL: int = 1024
+
+_MAGIC: bytes = b"FQI\x01"
+# file size, mtime_ns, record count, interval, number of offsets
+_HEADER: struct.Struct = struct.Struct("<4sQqQIQ")
+
+
+class FastqIndex:
+    """Record count and every interval-th record offset of a fastq file."""
+    __slots__ = ('size', 'mtime_ns', 'count', 'interval', 'offsets')
+
+    def __init__(self, size: int, mtime_ns: int, count: int, interval: int, offsets: array.array):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.count = count
+        self.interval = interval
+        self.offsets = offsets
+
+    def matches(self, path: str) -> bool:
+        """Check if the index is still up to date for the file at path."""
+        stat = os.stat(path)
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def save(self, index_path: str):
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(_HEADER.pack(_MAGIC, self.size, self.mtime_ns, self.count, self.interval,
+                                      len(self.offsets)))
+            offsets = array.array('Q', self.offsets)
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            offsets.tofile(handle)
+        os.replace(temp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: str) -> 'FastqIndex':
+        with open(index_path, "rb") as handle:
+            header = handle.read(_HEADER.size)
+            if len(header) != _HEADER.size or not header.startswith(_MAGIC):
+                raise ValueError(f"{index_path} is not a fastq index")
+            _, size, mtime_ns, count, interval, number_of_offsets = _HEADER.unpack(header)
+            offsets = array.array('Q')
+            offsets.fromfile(handle, number_of_offsets)
+            if sys.byteorder != "little":
+                offsets.byteswap()
+        return cls(size, mtime_ns, count, interval, offsets)
+
+
+def index_path_for(path: str) -> str:
+    return path + INDEX_EXTENSION
+
+
+def build_index(path: str, interval: int = DEFAULT_INTERVAL, chunk_size: int = DEFAULT_CHUNK_SIZE) -> FastqIndex:
+    """Build the index of an uncompressed fastq file in one pass."""
+    if detect_compression(path) is not None:
+        raise ValueError(f"{path} is compressed; an offset index requires an uncompressed file")
+    stat = os.stat(path)
+    offsets = array.array('Q')
+    count: int = 0
+    position: int = 0  # file offset of the first byte of leftover
+    leftover: bytes = b""
+    with open(path, "rb") as handle:
+        while True:
+            chunk: bytes = handle.read(chunk_size)
+            if not chunk:
+                break
+            buffer: bytes = leftover + chunk
+            lines = buffer.split(b"\n")
+            complete: int = (len(lines) - 1) // 4 * 4
+            line_ends = list(itertools.accumulate(map(len, lines[:complete])))
+            # record j of this chunk starts after 4 * j lines and their newlines
+            first: int = -count % interval
+            for j in range(first, complete // 4, interval):
+                offsets.append(position + (line_ends[4 * j - 1] if j else 0) + 4 * j)
+            count += complete // 4
+            consumed: int = (line_ends[-1] + complete) if complete else 0
+            position += consumed
+            leftover = buffer[consumed:]
+    trailing = leftover.rstrip(b"\r\n")
+    if trailing:
+        lines = trailing.split(b"\n")
+        if len(lines) != 4:
+            raise FastqFormatError(f"Truncated record after record {count} in {path}")
+        if count % interval == 0:
+            offsets.append(position)
+        count += 1
+    return FastqIndex(stat.st_size, stat.st_mtime_ns, count, interval, offsets)
+
+
+def load_index(path: str, interval: int = DEFAULT_INTERVAL) -> FastqIndex:
+    """Return the index of a fastq file.  The sidecar index is used if it is up
+    to date, otherwise the index is (re-)built and saved next to the file.
+    """
+    index_path = index_path_for(path)
+    try:
+        index = FastqIndex.load(index_path)
+        if index.matches(path):
+            return index
+    except (OSError, ValueError, EOFError):
+        pass
+
+    index = build_index(path, interval)
+    try:
+        index.save(index_path)
+    except OSError as e:
+        logging.warning(f"Could not write fastq index {index_path!r}: {e}")
+    return index
+
+
+def count_records(path: str) -> int:
+    """Return the number of records of a fastq file using its sidecar index."""
+    return load_index(path).count
+
+
+def seek_record(handle: BinaryIO, index: FastqIndex, record: int):
+    """Position a binary handle at the start of a record (counted from 0)."""
+    if not 0 <= record < index.count:
+        raise IndexError(f"Record {record} out of range for {index.count} records")
+    handle.seek(index.offsets[record // index.interval])
+    for _ in range(4 * (record % index.interval)):
+        handle.readline()
+
+
+def iter_fastq_from_record(path: str, record: int, index: Optional[FastqIndex] = None) -> Iterator[FastqRecord]:
+    """Iterate over the records of an uncompressed fastq file starting at a record."""
+    index = index or load_index(path)
+    with open(path, "rb") as handle:
+        seek_record(handle, index, record)
+        yield from iter_fastq_from_binary_handle(handle)
@@ -0,0 +1,82 @@
+"""Merge the per sample fasta files of a folder into one usearch input.
+
+Every header is replaced by '>{sample}_{n};barcodelabel={sample};size=N;' where
+n counts the records of the sample and the ';...;' annotations of the original
+header are kept.  Sequence lines are copied unchanged.  The samples are
+relabeled in parallel into temporary files which are concatenated in the
+order of their names, so the output does not depend on the number of workers.
+"""
+
+import concurrent.futures
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from ngssdk.compression import open_decompressed
+from ngssdk.fasta import size_annotation
+
+# Buffer size of the relabeled files and of the concatenation.
+DEFAULT_WRITE_SIZE: int = 1024 * 1024
+
+# From the first to the last ';' of a header, like usearch size annotations.
+_ANNOTATIONS = re.compile(rb";.*;")
+
+SampleCounts = Tuple[int, int]
+
+
+def sample_name(path: str) -> str:
+    """Return the file name without its last extension and without .gz."""
+    name = os.path.basename(path)
+    return os.path.splitext(name[:-3] if name.endswith(".gz") else name)[0]
+
+
+def relabel_header(header: bytes, sample: bytes, number: int) -> bytes:
+    match = _ANNOTATIONS.search(header)
+    annotations = match.group() if match else b""
+    return b">%s_%d;barcodelabel=%s%s\n" % (sample, number, sample, annotations)
+
+
+def relabel_fasta(input_path: str, output_path: str, sample: Optional[str] = None) -> SampleCounts:
+    """Write a (possibly compressed) fasta file with relabeled headers.
+    Return the number of records and the sum of their size annotations
+    (records without one count once).
+    """
+    label = (sample or sample_name(input_path)).encode()
+    records = 0
+    reads = 0
+    with open_decompressed(input_path) as handle, open(output_path, "wb", buffering=DEFAULT_WRITE_SIZE) as output:
+        for line in handle:
+            if line.startswith(b">"):
+                reads += size_annotation(line.rstrip(b"\r\n")) or 1
+                line = relabel_header(line, label, records)
+                records += 1
+            output.write(line)
+    return records, reads
+
+
+def find_fasta_files(directory: str) -> List[str]:
+    """Return the files of a directory in the order of their names; hidden files are skipped."""
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if not name.startswith(".") and os.path.isfile(os.path.join(directory, name))]
+
+
+def merge_fasta_folder(input_directory: str, output_path: str,
+                       workers: Optional[int] = None) -> Dict[str, SampleCounts]:
+    """Relabel every fasta file of a folder and concatenate them to output_path.
+    Return the number of records and reads per sample in output order.
+    """
+    paths = find_fasta_files(input_directory)
+    counts: Dict[str, SampleCounts] = {}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as parts_directory:
+        parts = [os.path.join(parts_directory, f"{i}.fasta") for i in range(len(paths))]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(relabel_fasta, path, part) for path, part in zip(paths, parts)]
+            with open(output_path, "wb") as output:
+                for path, part, future in zip(paths, parts, futures):
+                    counts[sample_name(path)] = future.result()
+                    with open(part, "rb") as handle:
+                        shutil.copyfileobj(handle, output, DEFAULT_WRITE_SIZE)
+                    os.remove(part)
+    return counts
@@ -0,0 +1,229 @@
+"""Sparse OTU tables in the tab separated layout of IMNGS and usearch.
+
+The first line holds the label of the ID column and the sample IDs, every
+further line an OTU ID and its count per sample.  An optional last column
+named "taxonomy" is kept as text next to the counts.  Counts are stored in
+compressed sparse row (CSR) form, so memory grows with the nonzero cells only.
+"""
+
+import collections
+import gzip
+import io
+import itertools
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+from ngssdk.compression import open_decompressed
+from ngssdk.custom_exceptions import OtuTableFormatError
+
+TAXONOMY_COLUMN: str = "taxonomy"
+
+DEFAULT_ID_LABEL: str = "#OTU ID"
+
+# Number of table lines parsed with one NumPy call.
+DEFAULT_PARSE_BATCH_SIZE: int = 10_000
+
+AbundanceFilterResult = collections.namedtuple('AbundanceFilterResult',
+                                               ['table', 'sample_sizes', 'filtered_sample_sizes'])
+
+
+class OtuTable:
+    """Counts of OTUs (rows) per sample (columns) in CSR form.
+    The counts of row i are data[indptr[i]:indptr[i + 1]] in the columns
+    indices[indptr[i]:indptr[i + 1]]; zeros are not stored.
+    """
+    __slots__ = ('otu_ids', 'sample_ids', 'indptr', 'indices', 'data', 'taxonomy', 'id_label')
+
+    def __init__(self, otu_ids: List[str], sample_ids: List[str], indptr: np.ndarray, indices: np.ndarray,
+                 data: np.ndarray, taxonomy: Optional[List[str]] = None, id_label: str = DEFAULT_ID_LABEL):
+        if len(indptr) != len(otu_ids) + 1 or len(indices) != len(data) or indptr[-1] != len(data):
+            raise ValueError("Inconsistent CSR arrays")
+        if taxonomy is not None and len(taxonomy) != len(otu_ids):
+            raise ValueError("Taxonomy differs in length from the OTU IDs")
+        self.otu_ids = list(otu_ids)
+        self.sample_ids = list(sample_ids)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data)
+        self.taxonomy = None if taxonomy is None else list(taxonomy)
+        self.id_label = id_label
+
+    @classmethod
+    def from_dense(cls, counts: np.ndarray, otu_ids: List[str], sample_ids: List[str],
+                   taxonomy: Optional[List[str]] = None, id_label: str = DEFAULT_ID_LABEL) -> 'OtuTable':
+        counts = np.asarray(counts)
+        if counts.shape != (len(otu_ids), len(sample_ids)):
+            raise ValueError(f"Expected a matrix of shape {(len(otu_ids), len(sample_ids))}; got {counts.shape}")
+        rows, columns = np.nonzero(counts)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(otu_ids)))))
+        return cls(otu_ids, sample_ids, indptr, columns, counts[rows, columns], taxonomy, id_label)
+
+    @property
+    def shape(self):
+        return len(self.otu_ids), len(self.sample_ids)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def row_indices(self) -> np.ndarray:
+        """Return the row of every stored count."""
+        return np.repeat(np.arange(len(self.otu_ids)), np.diff(self.indptr))
+
+    def to_dense(self, dtype=None) -> np.ndarray:
+        counts = np.zeros(self.shape, dtype=dtype or self.data.dtype)
+        counts[self.row_indices(), self.indices] = self.data
+        return counts
+
+    def to_csc(self):
+        """Return indptr, row indices and data of the counts in compressed sparse column form."""
+        order = np.argsort(self.indices, kind='stable')
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(self.indices, minlength=len(self.sample_ids)))))
+        return indptr, self.row_indices()[order], self.data[order]
+
+    def sample_sizes(self) -> np.ndarray:
+        """Return the total count of every sample."""
+        return np.bincount(self.indices, weights=self.data, minlength=len(self.sample_ids))
+
+    def otu_sizes(self) -> np.ndarray:
+        """Return the total count of every OTU."""
+        return np.bincount(self.row_indices(), weights=self.data, minlength=len(self.otu_ids))
+
+    def max_relative_abundance(self, sample_sizes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the highest relative abundance of every OTU over all samples.
+        Samples with a size of 0 do not contribute.
+        """
+        sizes = self.sample_sizes() if sample_sizes is None else np.asarray(sample_sizes, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = self.data / sizes[self.indices]
+        relative[~np.isfinite(relative)] = 0
+        maxima = np.zeros(len(self.otu_ids))
+        np.maximum.at(maxima, self.row_indices(), relative)
+        return maxima
+
+    def scale_samples(self, factors: np.ndarray, dtype=None) -> 'OtuTable':
+        """Return a table with the counts of every sample multiplied by its factor."""
+        factors = np.asarray(factors, dtype=dtype or np.float64)
+        if len(factors) != len(self.sample_ids):
+            raise ValueError(f"Expected {len(self.sample_ids)} factors; got {len(factors)}")
+        data = self.data.astype(factors.dtype) * factors[self.indices]
+        return OtuTable(self.otu_ids, self.sample_ids, self.indptr, self.indices, data, self.taxonomy, self.id_label)
+
+    def select_otus(self, keep: np.ndarray) -> 'OtuTable':
+        """Return a table with the OTUs of a boolean mask or an array of row numbers."""
+        rows = np.flatnonzero(keep) if np.asarray(keep).dtype == bool else np.asarray(keep, dtype=np.int64)
+        lengths = np.diff(self.indptr)[rows]
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        # position of every selected count in the data of this table
+        positions = np.repeat(self.indptr[rows] - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return OtuTable([self.otu_ids[i] for i in rows], self.sample_ids, indptr, self.indices[positions],
+                        self.data[positions], None if self.taxonomy is None else [self.taxonomy[i] for i in rows],
+                        self.id_label)
+
+
+def filter_relative_abundance(table: OtuTable, cutoff: float) -> AbundanceFilterResult:
+    """Keep the OTUs whose relative abundance exceeds cutoff in at least one
+    sample.  Return the filtered table and the sample sizes before and after
+    filtering, all computed from one pass over the nonzero counts.
+    """
+    sample_sizes = table.sample_sizes()
+    filtered = table.select_otus(table.max_relative_abundance(sample_sizes) > cutoff)
+    return AbundanceFilterResult(filtered, sample_sizes, filtered.sample_sizes())
+
+
+def parse_otu_table(lines: Iterable[str], dtype=np.float64,
+                    batch_size: int = DEFAULT_PARSE_BATCH_SIZE) -> OtuTable:
+    """Build an OtuTable from the lines of a tab separated table.
+    The counts of batch_size lines are converted with one NumPy call and only
+    their nonzero cells are kept.
+    """
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        raise OtuTableFormatError("The OTU table is empty")
+    columns = header.rstrip("\r\n").split("\t")
+    has_taxonomy = len(columns) > 1 and columns[-1] == TAXONOMY_COLUMN
+    sample_ids = columns[1:-1] if has_taxonomy else columns[1:]
+    n_samples = len(sample_ids)
+
+    otu_ids: List[str] = []
+    taxonomy: Optional[List[str]] = [] if has_taxonomy else None
+    row_lengths, indices, data = [], [], []
+    while True:
+        raw = list(itertools.islice(lines, batch_size))
+        if not raw:
+            break
+        batch = [line for line in (line.rstrip("\r\n") for line in raw) if line]
+        cells = []
+        for line in batch:
+            fields = line.split("\t", 1)
+            rest = fields[1] if len(fields) > 1 else ""
+            if has_taxonomy:
+                # OTUs without classification may lack the taxonomy column
+                if rest.count("\t") == n_samples:
+                    rest, _, lineage = rest.rpartition("\t")
+                else:
+                    lineage = ""
+                taxonomy.append(lineage)
+            if (rest.count("\t") + 1 if rest else 0) != n_samples:
+                raise OtuTableFormatError(f"OTU {fields[0]!r} does not have {n_samples} counts")
+            otu_ids.append(fields[0])
+            cells.append(rest)
+        if n_samples == 0:
+            row_lengths.append(np.zeros(len(batch), dtype=np.int64))
+            continue
+        try:
+            counts = np.array(" ".join(cells).split(), dtype=dtype).reshape(len(batch), n_samples)
+        except ValueError as e:
+            raise OtuTableFormatError(f"Invalid count in the OTU table: {e}") from None
+        rows, samples = np.nonzero(counts)
+        row_lengths.append(np.bincount(rows, minlength=len(batch)))
+        indices.append(samples)
+        data.append(counts[rows, samples])
+
+    indptr = np.concatenate(([0], np.cumsum(np.concatenate(row_lengths)) if row_lengths else []))
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    data = np.concatenate(data) if data else np.zeros(0, dtype=dtype)
+    return OtuTable(otu_ids, sample_ids, indptr, indices, data, taxonomy, columns[0])
+
+
+def read_otu_table(path: str, dtype=np.float64) -> OtuTable:
+    """Read a (possibly compressed) OTU table."""
+    with io.TextIOWrapper(open_decompressed(path), encoding="utf-8") as handle:
+        return parse_otu_table(handle, dtype)
+
+
+def format_otu_table(table: OtuTable, batch_size: int = DEFAULT_PARSE_BATCH_SIZE) -> Iterator[str]:
+    """Yield the lines of an OtuTable in the tab separated layout.
+    Tables with integral counts only are written without decimals.
+    """
+    columns = [table.id_label] + table.sample_ids
+    if table.taxonomy is not None:
+        columns.append(TAXONOMY_COLUMN)
+    yield "\t".join(columns) + "\n"
+
+    integral = bool(np.all(np.mod(table.data, 1) == 0))
+    for start in range(0, len(table.otu_ids), batch_size):
+        block = table.select_otus(np.arange(start, min(start + batch_size, len(table.otu_ids))))
+        counts = block.to_dense(np.int64 if integral else np.float64).tolist()
+        for i, (otu_id, row) in enumerate(zip(block.otu_ids, counts)):
+            fields = [otu_id] + [str(count) for count in row]
+            if block.taxonomy is not None:
+                fields.append(block.taxonomy[i])
+            yield "\t".join(fields) + "\n"
+
+
+def write_otu_table(table: OtuTable, handle: TextIO) -> int:
+    """Write an OtuTable to a text handle and return the number of OTUs."""
+    handle.writelines(format_otu_table(table))
+    return len(table.otu_ids)
+
+
+def save_otu_table(table: OtuTable, path: str) -> int:
+    """Write an OtuTable to a file, gzip compressed if the path ends with .gz."""
+    if path.endswith(".gz"):
+        with gzip.open(path, "wt", encoding="utf-8") as handle:
+            return write_otu_table(table, handle)
+    with open(path, "w", encoding="utf-8") as handle:
+        return write_otu_table(table, handle)
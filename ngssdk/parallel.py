@@ -0,0 +1,103 @@
+"""Methods to process one uncompressed fastq file on multiple cores."""
+
+import concurrent.futures
+import functools
+import os
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+from ngssdk.compression import detect_compression
+from ngssdk.fastq import DEFAULT_CHUNK_SIZE, FastqRecord, iter_fastq_from_binary_handle
+
+# Smallest byte range handed to a worker.
+MIN_RANGE_SIZE: int = 8 * 1024 * 1024
+
+# Number of bytes inspected to find the next record start after an offset.
+_WINDOW_SIZE: int = 64 * 1024
+
+ByteRange = Tuple[int, int]
+
+
+def find_record_start(handle: BinaryIO, offset: int) -> int:
+    """Return the offset of the first fastq record starting at or after offset.
+    A line is only accepted as a header if it starts with '@', the line two
+    below starts with '+' and sequence and quality have the same length; this
+    rejects quality lines that happen to start with '@'.
+    """
+    if offset == 0:
+        return 0
+    # offset - 1 is included to detect whether offset is the start of a line
+    handle.seek(offset - 1)
+    window: bytes = b""
+    while True:
+        data: bytes = handle.read(max(_WINDOW_SIZE, len(window)))
+        at_eof = not data
+        window += data
+        line_start = window.find(b"\n") + 1
+        if line_start:
+            lines = window[line_start:].split(b"\n")
+            # before the end of file the last element may be an incomplete line
+            complete = lines if at_eof else lines[:-1]
+            for i in range(len(complete) - 3):
+                if (lines[i].startswith(b"@") and lines[i + 2].startswith(b"+")
+                        and len(lines[i + 1].rstrip(b"\r")) == len(lines[i + 3].rstrip(b"\r"))):
+                    return offset - 1 + line_start + sum(len(line) + 1 for line in lines[:i])
+        if at_eof:
+            return offset - 1 + len(window)
+
+
+def split_fastq(path: str, ranges: int, min_range_size: int = MIN_RANGE_SIZE) -> List[ByteRange]:
+    """Split an uncompressed fastq file into up to `ranges` byte ranges of at
+    least min_range_size bytes which each start at a record boundary.
+    """
+    size: int = os.path.getsize(path)
+    range_size: int = max(min_range_size, -(-size // max(1, ranges)), 1)
+    with open(path, "rb") as handle:
+        starts = sorted({find_record_start(handle, offset) for offset in range(0, size, range_size)})
+    return [(start, end) for start, end in zip(starts, starts[1:] + [size]) if start < end]
+
+
+class _RangeReader:
+    """A binary reader limited to a byte range of a file."""
+
+    def __init__(self, handle: BinaryIO, start: int, end: int):
+        self.handle = handle
+        self.handle.seek(start)
+        self.remaining = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def iter_fastq_range(path: str, byte_range: ByteRange, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[FastqRecord]:
+    """Iterate over the records of an uncompressed fastq file within a byte range
+    as returned by split_fastq.
+    """
+    with open(path, "rb") as handle:
+        yield from iter_fastq_from_binary_handle(_RangeReader(handle, *byte_range), chunk_size)
+
+
+def _apply(function: Callable[[Iterator[FastqRecord]], object], path: str, byte_range: ByteRange):
+    return function(iter_fastq_range(path, byte_range))
+
+
+def map_fastq_chunks(path: str, function: Callable[[Iterator[FastqRecord]], object],
+                     reduce: Optional[Callable] = None, workers: Optional[int] = None):
+    """Apply function to the records of an uncompressed fastq file on multiple cores.
+    The file is split into byte ranges aligned to record starts and function
+    is called once per range with an iterator over its FastqRecord objects in a
+    process pool.  function must be picklable, i.e. defined at module level.
+    The results are returned in file order, or combined with reduce if given.
+    """
+    if detect_compression(path) is not None:
+        raise ValueError(f"{path} is compressed; byte ranges require an uncompressed file")
+    workers = workers or os.cpu_count() or 1
+    ranges = split_fastq(path, workers * 4)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(functools.partial(_apply, function, path), ranges))
+    if reduce is None:
+        return results
+    return functools.reduce(reduce, results)
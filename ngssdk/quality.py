@@ -0,0 +1,86 @@
+"""Vectorized quality score computations on FastqBatch objects."""
+
+import collections
+
+import numpy as np
+
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import FastqBatch
+
+# Offset of Phred+33 (Sanger, Illumina 1.8+) encoded quality scores.
+PHRED_OFFSET: int = 33
+
+# Error probability for every possible quality score.
+ERROR_PROBABILITIES: np.ndarray = 10.0 ** (-np.arange(256) / 10.0)
+
+QualitySummary = collections.namedtuple('QualitySummary',
+                                        ['lengths', 'expected_errors', 'expected_error_rates', 'mean_qualities',
+                                         'truncation_positions'])
+
+
+def decode_qualities(batch: FastqBatch, offset: int = PHRED_OFFSET) -> np.ndarray:
+    """Decode the quality strings of all records into one flat uint8 array of
+    quality scores.  Record i spans batch.offsets[i]:batch.offsets[i + 1].
+    """
+    encoded = np.frombuffer(batch.qualities, dtype=np.uint8)
+    if encoded.size and encoded.min() < offset:
+        raise FastqFormatError(f"Quality character below the Phred offset {offset} found")
+    return encoded - np.uint8(offset)
+
+
+def quality_matrix(batch: FastqBatch, offset: int = PHRED_OFFSET, fill: int = 0) -> np.ndarray:
+    """Decode the quality strings of all records into a (records x max length)
+    uint8 matrix.  Positions beyond the end of a read are set to fill.
+    """
+    scores = decode_qualities(batch, offset)
+    starts, lengths = _starts_and_lengths(batch)
+    matrix = np.full((len(batch), int(lengths.max(initial=0))), fill, dtype=np.uint8)
+    rows = np.repeat(np.arange(len(batch)), lengths)
+    columns = np.arange(scores.size) - np.repeat(starts, lengths)
+    matrix[rows, columns] = scores
+    return matrix
+
+
+def expected_errors(batch: FastqBatch, offset: int = PHRED_OFFSET) -> np.ndarray:
+    """Return the expected number of errors (sum of error probabilities) per read."""
+    return summarize_qualities(batch, offset=offset).expected_errors
+
+
+def summarize_qualities(batch: FastqBatch, truncation_quality: int = 2, offset: int = PHRED_OFFSET) -> QualitySummary:
+    """Compute per-read quality statistics of a batch in one vectorized pass.
+
+    - lengths: read lengths
+    - expected_errors: sum of error probabilities, as usearch -fastq_maxee
+    - expected_error_rates: expected errors divided by read length, as usearch
+      -fastq_maxee_rate; 0 for empty reads
+    - mean_qualities: arithmetic mean of the quality scores; 0 for empty reads
+    - truncation_positions: index of the first base with a quality score of at
+      most truncation_quality, as usearch -fastq_truncqual/-fastq_trunctail;
+      the read length if there is none
+    """
+    scores = decode_qualities(batch, offset)
+    starts, lengths = _starts_and_lengths(batch)
+    ends = starts + lengths
+
+    errors = _segment_sums(ERROR_PROBABILITIES[scores], starts, ends)
+    quality_sums = _segment_sums(scores.astype(np.int64), starts, ends)
+    nonempty = lengths > 0
+    error_rates = np.divide(errors, lengths, out=np.zeros(len(batch)), where=nonempty)
+    mean_qualities = np.divide(quality_sums, lengths, out=np.zeros(len(batch)), where=nonempty)
+
+    low = np.flatnonzero(scores <= truncation_quality)
+    first_low = np.searchsorted(low, starts)
+    candidates = np.append(low, scores.size)[first_low]
+    truncation_positions = np.minimum(candidates, ends) - starts
+
+    return QualitySummary(lengths, errors, error_rates, mean_qualities, truncation_positions)
+
+
+def _starts_and_lengths(batch: FastqBatch):
+    offsets = np.frombuffer(batch.offsets, dtype=np.int64)
+    return offsets[:-1], np.diff(offsets)
+
+
+def _segment_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    cumulative = np.concatenate(([0], np.cumsum(values)))
+    return cumulative[ends] - cumulative[starts]
@@ -0,0 +1,299 @@
+"""A k-mer screen that separates reads which cannot stem from spike-in sequences.
+
+Reads sharing no sampled k-mer with the spikes (or their reverse complements)
+are classified NOT_SPIKE, reads with at least likely_fraction of their sampled
+k-mers in the spikes LIKELY_SPIKE and all others AMBIGUOUS.  Only the k-mers
+starting every `stride` bases of a read are looked up.  Any exact match of
+k + stride - 1 bases contains a sampled k-mer, so with the defaults (16 + 7 - 1
+= 22, the seed length of bowtie2 in end-to-end mode) a NOT_SPIKE read has no
+exact seed hit and can be skipped by the alignment.  Reads shorter than k
+have no k-mer at all and are therefore always NOT_SPIKE.
+"""
+
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from ngssdk.compression import open_decompressed
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fasta import iter_fasta
+from ngssdk.fastq import DEFAULT_CHUNK_SIZE, FastqBatch
+
+NOT_SPIKE: int = 0
+AMBIGUOUS: int = 1
+LIKELY_SPIKE: int = 2
+
+DEFAULT_K: int = 16
+DEFAULT_STRIDE: int = 7
+DEFAULT_LIKELY_FRACTION: float = 0.5
+
+# Size of the hashed bitmap that rejects most k-mers before the exact lookup.
+FILTER_BITS: int = 22
+
+# Buffer size of the screened output files.
+DEFAULT_WRITE_SIZE: int = 1024 * 1024
+
+# Bases are encoded by bits 1 and 2 of their ASCII code: A 0, C 1, T 2, G 3 (lower case alike).
+_INVALID: int = 4
+_ENCODING = np.full(256, _INVALID, dtype=np.uint8)
+for _base in b"ACGTacgt":
+    _ENCODING[_base] = (_base >> 1) & 3
+_COMPLEMENT = bytes.maketrans(b"ACGTacgt", b"TGCAtgca")
+
+# Multiplying 4 bytes holding 2 bit codes by this moves them to bits 24 to 31, first byte highest.
+_PACK_FACTOR = np.uint32((1 << 30) + (1 << 20) + (1 << 10) + 1)
+
+# Fibonacci hashing constants
+_HASH_FACTORS = {np.uint32: np.uint32(0x9E3779B1), np.uint64: np.uint64(0x9E3779B97F4A7C15)}
+
+_NEWLINE, _CARRIAGE_RETURN, _AT, _PLUS = b"\n\r@+"
+
+
+class KmerScreen:
+    """The k-mers of a set of spike sequences on both strands.
+    Lookups go through a hashed bitmap first; only its hits are verified
+    against the sorted k-mer codes.
+    """
+    __slots__ = ('kmers', 'k', 'stride', 'dtype', 'bitmap')
+
+    def __init__(self, kmers: np.ndarray, k: int, stride: int = DEFAULT_STRIDE):
+        if not 0 < k <= 32:
+            raise ValueError(f"k must be between 1 and 32; got {k!r}")
+        if stride < 1:
+            raise ValueError(f"stride must be positive; got {stride!r}")
+        self.dtype = np.uint32 if k <= 16 else np.uint64
+        self.kmers = np.unique(np.asarray(kmers).astype(self.dtype))
+        self.k = k
+        self.stride = stride
+        self.bitmap = np.zeros(1 << FILTER_BITS, dtype=bool)
+        self.bitmap[self._hash(self.kmers)] = True
+
+    @classmethod
+    def from_sequences(cls, sequences: Iterable[bytes], k: int = DEFAULT_K,
+                       stride: int = DEFAULT_STRIDE) -> 'KmerScreen':
+        codes = []
+        for sequence in sequences:
+            for strand in (sequence, sequence.translate(_COMPLEMENT)[::-1]):
+                strand_codes, valid = kmer_codes(strand, k)
+                codes.append(strand_codes[valid])
+        return cls(np.concatenate(codes) if codes else np.zeros(0, dtype=np.uint64), k, stride)
+
+    @classmethod
+    def from_fasta(cls, path: str, k: int = DEFAULT_K, stride: int = DEFAULT_STRIDE) -> 'KmerScreen':
+        return cls.from_sequences((record.sequence for record in iter_fasta(path)), k, stride)
+
+    def __len__(self) -> int:
+        return len(self.kmers)
+
+    def _hash(self, codes: np.ndarray) -> np.ndarray:
+        bits = np.dtype(self.dtype).itemsize * 8
+        return (codes * _HASH_FACTORS[self.dtype]) >> self.dtype(bits - FILTER_BITS)
+
+    def hits_in(self, buffer: bytes, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the number of sampled k-mers found in the spikes and the
+        number of sampled k-mers without N of every sequence buffer[starts[i]:ends[i]].
+        Sequences shorter than k count no k-mers.
+        """
+        n_kmers = np.maximum(0, (ends - starts - self.k) // self.stride + 1)
+        reads = np.repeat(np.arange(len(starts)), n_kmers)
+        first = np.cumsum(n_kmers) - n_kmers
+        positions = starts[reads] + (np.arange(len(reads)) - first[reads]) * self.stride
+
+        # k-mers are assembled from the 4 bases of unaligned 32 bit words, so
+        # only the sampled bytes are read and each is gathered once
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        words = np.ndarray(shape=(max(0, len(raw) - 3),), dtype='<u4', buffer=raw, strides=(1,))
+        codes = np.zeros(len(positions), dtype=self.dtype)
+        valid = np.ones(len(positions), dtype=bool)
+        for j in range(0, self.k - 3, 4):
+            quads, quads_valid = _encode_bases(words[positions + j], 0x01010101)
+            codes <<= self.dtype(8)
+            codes |= ((quads * _PACK_FACTOR) >> np.uint32(24)).astype(self.dtype)
+            valid &= quads_valid
+        for j in range(self.k // 4 * 4, self.k):
+            base, base_valid = _encode_bases(raw[positions + j], 0x01)
+            codes <<= self.dtype(2)
+            codes |= base.astype(self.dtype)
+            valid &= base_valid
+
+        candidates = np.flatnonzero(valid & self.bitmap[self._hash(codes)])
+        found = np.zeros(len(codes), dtype=bool)
+        if len(candidates):
+            kmer_positions = np.minimum(np.searchsorted(self.kmers, codes[candidates]), len(self.kmers) - 1)
+            found[candidates] = self.kmers[kmer_positions] == codes[candidates]
+        return (np.bincount(reads[found], minlength=len(starts)),
+                np.bincount(reads[valid], minlength=len(starts)))
+
+    def hits(self, batch: FastqBatch) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the number of sampled k-mers found in the spikes and the
+        number of sampled k-mers without N of every read of a batch.
+        """
+        offsets = np.frombuffer(batch.offsets, dtype=np.int64)
+        return self.hits_in(batch.sequences, offsets[:-1], offsets[1:])
+
+    def classify_hits(self, found: np.ndarray, total: np.ndarray,
+                      likely_fraction: float = DEFAULT_LIKELY_FRACTION) -> np.ndarray:
+        classes = np.full(len(found), AMBIGUOUS, dtype=np.uint8)
+        classes[found == 0] = NOT_SPIKE
+        classes[(found > 0) & (found >= likely_fraction * total)] = LIKELY_SPIKE
+        return classes
+
+    def classify(self, batch: FastqBatch, likely_fraction: float = DEFAULT_LIKELY_FRACTION) -> np.ndarray:
+        """Classify every read of a batch as NOT_SPIKE, AMBIGUOUS or LIKELY_SPIKE."""
+        return self.classify_hits(*self.hits(batch), likely_fraction)
+
+
+def _encode_bases(values: np.ndarray, lanes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the 2 bit codes of the bases in every byte of an unsigned integer
+    array (lanes is 0x01 repeated for every byte) and whether all are A, C, G or T.
+    """
+    dtype = values.dtype.type
+    codes = (values >> dtype(1)) & dtype(3 * lanes)
+    # a byte is a valid base if its lower case equals the base of its code
+    is_t = (codes >> dtype(1)) & ~codes & dtype(lanes)
+    expected = dtype(0x61 * lanes) + (codes << dtype(1)) + is_t * dtype(0x74 - 0x61 - 4)
+    return codes, (values | dtype(0x20 * lanes)) == expected
+
+
+def kmer_codes(sequence: bytes, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the 2 bit encoded k-mer starting at every position of a sequence
+    and a mask of the k-mers without ambiguous bases.
+    """
+    values = _ENCODING[np.frombuffer(sequence, dtype=np.uint8)]
+    n: int = max(0, len(values) - k + 1)
+    codes = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        codes <<= np.uint64(2)
+        codes |= (values[j:j + n] & 3).astype(np.uint64)
+    invalid = np.concatenate(([0], np.cumsum(values == _INVALID)))
+    return codes, invalid[k:k + n] == invalid[:n]
+
+
+def classify_pairs(screen: KmerScreen, r1_batch: FastqBatch, r2_batch: FastqBatch,
+                   likely_fraction: float = DEFAULT_LIKELY_FRACTION) -> np.ndarray:
+    """Classify mate pairs by the higher class of both mates."""
+    if len(r1_batch) != len(r2_batch):
+        raise ValueError("Mate batches differ in length")
+    return np.maximum(screen.classify(r1_batch, likely_fraction), screen.classify(r2_batch, likely_fraction))
+
+
+class _RawRecords:
+    """Complete fastq records of a handle as one byte buffer and the offsets of
+    their line ends.  Records are consumed from the front with take().
+    """
+    __slots__ = ('handle', 'chunk_size', 'data', 'newlines', 'leftover', 'path')
+
+    def __init__(self, handle: BinaryIO, chunk_size: int, path: str):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.path = path
+        self.data = b""
+        self.newlines = np.zeros(0, dtype=np.int64)
+        self.leftover = b""
+
+    def __len__(self) -> int:
+        return len(self.newlines) // 4
+
+    def fill(self) -> bool:
+        """Append the complete records of the next chunk.  Return False at the end of the file."""
+        chunk = self.handle.read(self.chunk_size)
+        if not chunk:
+            if not self.leftover.strip():
+                return False
+            if self.leftover.endswith(b"\n") or self.leftover.count(b"\n") != 3:
+                raise FastqFormatError(f"{self.path} ends with an incomplete record")
+            # the last record lacks only its final newline
+            chunk = b"\n"
+        data = self.leftover + chunk
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == _NEWLINE)
+        complete = len(newlines) // 4 * 4
+        end = int(newlines[complete - 1]) + 1 if complete else 0
+        self.leftover = data[end:]
+        self.newlines = np.concatenate((self.newlines, newlines[:complete] + len(self.data)))
+        self.data += data[:end]
+        return True
+
+    def take(self, n: int) -> Tuple[bytes, np.ndarray]:
+        end = int(self.newlines[4 * n - 1]) + 1 if n else 0
+        data, newlines = self.data[:end], self.newlines[:4 * n]
+        self.data = self.data[end:]
+        self.newlines = self.newlines[4 * n:] - end
+        return data, newlines
+
+
+def _record_layout(data: bytes, newlines: np.ndarray, path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Check the records of a buffer and return their ends and the start and end of their sequences."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = newlines[3::4] + 1
+    starts = np.concatenate(([0], ends[:-1]))
+    sequence_starts = newlines[0::4] + 1
+    sequence_ends = newlines[1::4] - (raw[np.maximum(newlines[1::4] - 1, 0)] == _CARRIAGE_RETURN)
+    quality_ends = newlines[3::4] - (raw[newlines[3::4] - 1] == _CARRIAGE_RETURN)
+    if not (np.all(raw[starts] == _AT) and np.all(raw[newlines[1::4] + 1] == _PLUS)
+            and np.array_equal(sequence_ends - sequence_starts, quality_ends - newlines[2::4] - 1)):
+        raise FastqFormatError(f"{path} contains malformed fastq records")
+    return ends, sequence_starts, sequence_ends
+
+
+def _iter_pair_blocks(r1_path: str, r2_path: str, chunk_size: int) -> Iterator[Tuple[Tuple[bytes, np.ndarray],
+                                                                                     Tuple[bytes, np.ndarray]]]:
+    """Yield the raw records of both files in blocks with the same number of records."""
+    with open_decompressed(r1_path) as r1_handle, open_decompressed(r2_path) as r2_handle:
+        r1 = _RawRecords(r1_handle, chunk_size, r1_path)
+        r2 = _RawRecords(r2_handle, chunk_size, r2_path)
+        while True:
+            while not len(r1) and r1.fill():
+                pass
+            while not len(r2) and r2.fill():
+                pass
+            n = min(len(r1), len(r2))
+            if not n:
+                if len(r1) or len(r2):
+                    raise FastqFormatError(f"{r1_path} and {r2_path} contain different numbers of records")
+                return
+            yield r1.take(n), r2.take(n)
+
+
+def split_fastq_pair(r1_path: str, r2_path: str, screen: KmerScreen, outputs: Dict[int, Tuple[str, str]],
+                     likely_fraction: float = DEFAULT_LIKELY_FRACTION,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[int]:
+    """Screen the pairs of two (possibly compressed) fastq files and write them
+    to the (R1, R2) output paths of their class.  Several classes may share
+    outputs; classes without output are dropped.  Records are copied as they
+    are and runs of pairs with the same output are written at once.
+    Return the number of pairs per class.
+    """
+    groups = sorted(set(outputs.values()))
+    target_of_class = np.full(3, -1, dtype=np.int64)
+    for read_class, paths in outputs.items():
+        target_of_class[read_class] = groups.index(paths)
+    handles: List[Tuple[BinaryIO, BinaryIO]] = []
+    counts = np.zeros(3, dtype=np.int64)
+    try:
+        for paths in groups:
+            handles.append((open(paths[0], "wb", buffering=DEFAULT_WRITE_SIZE),
+                            open(paths[1], "wb", buffering=DEFAULT_WRITE_SIZE)))
+        for (r1_data, r1_newlines), (r2_data, r2_newlines) in _iter_pair_blocks(r1_path, r2_path, chunk_size):
+            r1_ends, r1_starts, r1_sequence_ends = _record_layout(r1_data, r1_newlines, r1_path)
+            r2_ends, r2_starts, r2_sequence_ends = _record_layout(r2_data, r2_newlines, r2_path)
+            classes = np.maximum(
+                screen.classify_hits(*screen.hits_in(r1_data, r1_starts, r1_sequence_ends), likely_fraction),
+                screen.classify_hits(*screen.hits_in(r2_data, r2_starts, r2_sequence_ends), likely_fraction))
+            counts += np.bincount(classes, minlength=3)
+
+            targets = target_of_class[classes]
+            run_starts = np.concatenate(([0], np.flatnonzero(targets[1:] != targets[:-1]) + 1))
+            run_ends = np.append(run_starts[1:], len(targets))
+            r1_view, r2_view = memoryview(r1_data), memoryview(r2_data)
+            for run_start, run_end, target in zip(run_starts.tolist(), run_ends.tolist(),
+                                                  targets[run_starts].tolist()):
+                if target < 0:
+                    continue
+                r1_handle, r2_handle = handles[target]
+                r1_handle.write(r1_view[r1_ends[run_start - 1] if run_start else 0:r1_ends[run_end - 1]])
+                r2_handle.write(r2_view[r2_ends[run_start - 1] if run_start else 0:r2_ends[run_end - 1]])
+    finally:
+        for r1_handle, r2_handle in handles:
+            r1_handle.close()
+            r2_handle.close()
+    return counts.tolist()
@@ -0,0 +1,175 @@
+"""Single-pass quality control profiles of fastq files."""
+
+import concurrent.futures
+import json
+import logging
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ngssdk.checks import has_illumina_read_naming_scheme
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import DEFAULT_BATCH_SIZE, FastqBatch, iter_fastq_batches
+from ngssdk.filename_manipulations import remove_extension
+from ngssdk.quality import decode_qualities
+
+# Phred+33 scores range from 0 ('!') to 93 ('~').
+QUALITY_LEVELS: int = 94
+
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+FASTQ_EXTENSIONS = ('.fastq', '.fastq.gz')
+
+_GC = [ord(base) for base in "GCgc"]
+_ACGT = [ord(base) for base in "ACGTacgt"]
+_N = [ord(base) for base in "Nn"]
+
+
+class FastqProfile:
+    """Accumulates read count, length histogram, base composition and the
+    quality score histogram of every read position over FastqBatch objects.
+    All accumulators are NumPy arrays updated with one bincount per batch.
+    """
+
+    def __init__(self):
+        self.reads: int = 0
+        self.length_counts = np.zeros(0, dtype=np.int64)
+        self.base_counts = np.zeros(256, dtype=np.int64)
+        self.position_quality_counts = np.zeros((0, QUALITY_LEVELS), dtype=np.int64)
+
+    def add(self, batch: FastqBatch):
+        offsets = np.frombuffer(batch.offsets, dtype=np.int64)
+        starts, lengths = offsets[:-1], np.diff(offsets)
+        scores = np.minimum(decode_qualities(batch), QUALITY_LEVELS - 1)
+        longest = int(lengths.max(initial=0))
+
+        self.reads += len(batch)
+        self.length_counts = _add_padded(self.length_counts, np.bincount(lengths, minlength=longest + 1))
+        self.base_counts += np.bincount(np.frombuffer(batch.sequences, dtype=np.uint8), minlength=256)
+
+        positions = np.arange(scores.size) - np.repeat(starts, lengths)
+        counts = np.bincount(positions * QUALITY_LEVELS + scores, minlength=longest * QUALITY_LEVELS)
+        self.position_quality_counts = _add_padded(self.position_quality_counts,
+                                                   counts.reshape(longest, QUALITY_LEVELS))
+
+    def merge(self, other: 'FastqProfile') -> 'FastqProfile':
+        self.reads += other.reads
+        self.length_counts = _add_padded(self.length_counts, other.length_counts)
+        self.base_counts += other.base_counts
+        self.position_quality_counts = _add_padded(self.position_quality_counts, other.position_quality_counts)
+        return self
+
+    @property
+    def bases(self) -> int:
+        return int(self.position_quality_counts.sum())
+
+    def to_dict(self, quantiles: Iterable[float] = DEFAULT_QUANTILES) -> dict:
+        """Summarize the profile as a JSON serializable dict."""
+        quantiles = list(quantiles)
+        acgt = int(self.base_counts[_ACGT].sum())
+        lengths = np.arange(len(self.length_counts))
+        covering = self.position_quality_counts.sum(axis=1)
+        cumulative = self.position_quality_counts.cumsum(axis=1)
+        mean_qualities = np.divide(self.position_quality_counts @ np.arange(QUALITY_LEVELS), covering,
+                                   out=np.zeros(len(covering)), where=covering > 0)
+
+        return {
+            'reads': self.reads,
+            'bases': self.bases,
+            'mean_length': float(lengths @ self.length_counts / self.reads) if self.reads else 0.0,
+            'length_histogram': {int(length): int(count) for length, count in enumerate(self.length_counts)
+                                 if count},
+            'gc_content': float(self.base_counts[_GC].sum() / acgt) if acgt else 0.0,
+            'n_rate': float(self.base_counts[_N].sum() / self.bases) if self.bases else 0.0,
+            'position_quality': {
+                'reads': covering.tolist(),
+                'mean': mean_qualities.round(2).tolist(),
+                'quantiles': {str(q): (cumulative < q * covering[:, None]).sum(axis=1).tolist() for q in quantiles},
+            },
+        }
+
+
+def _add_padded(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Add two arrays of possibly different length along the first axis."""
+    if len(a) < len(b):
+        a, b = b, a
+    a = a.copy()
+    a[:len(b)] += b
+    return a
+
+
+def profile_fastq(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> FastqProfile:
+    """Compute the profile of a (possibly compressed) fastq file in one pass."""
+    profile = FastqProfile()
+    for batch in iter_fastq_batches(path, batch_size):
+        profile.add(batch)
+    return profile
+
+
+def _profile_as_dict(path: str) -> dict:
+    return profile_fastq(path).to_dict()
+
+
+def profile_files(samples: Dict[str, str], workers: Optional[int] = None,
+                  skip_errors: bool = False) -> Dict[str, dict]:
+    """Profile the fastq files of several samples in parallel.
+    samples maps a sample name to a file path; a dict mapping the sample name
+    to its profile (see FastqProfile.to_dict) is returned.  With skip_errors,
+    samples whose file is malformed, truncated or unreadable are logged and
+    left out instead of raising.
+    """
+    profiles: Dict[str, dict] = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(_profile_as_dict, samples[name]) for name in sorted(samples)}
+        for name, future in futures.items():
+            try:
+                profiles[name] = future.result()
+            except (FastqFormatError, OSError, EOFError, zlib.error) as e:
+                if not skip_errors:
+                    raise
+                logging.error(f'Skipping quality profile of {name}: {e}')
+    return profiles
+
+
+def collect_fastq_files(directory: str) -> Dict[str, str]:
+    """Map the name of every Illumina read file in a directory to its path.
+    If both a .fastq and a .fastq.gz file exist, the uncompressed one is used.
+    """
+    samples: Dict[str, str] = {}
+    for node in sorted(os.listdir(directory)):  # .fastq sorts before .fastq.gz
+        path = os.path.join(directory, node)
+        if os.path.isfile(path) and has_illumina_read_naming_scheme(node, accepted_extensions=FASTQ_EXTENSIONS):
+            samples.setdefault(remove_extension(node, FASTQ_EXTENSIONS), path)
+    return samples
+
+
+def write_profile(sample: str, profile: dict, directory: str):
+    """Write a profile as <sample>.qc.json and the per position quality as
+    <sample>.qc.tab.
+    """
+    with open(os.path.join(directory, f'{sample}.qc.json'), 'w') as handle:
+        json.dump(profile, handle, indent=1)
+
+    position_quality = profile['position_quality']
+    quantiles = list(position_quality['quantiles'])
+    with open(os.path.join(directory, f'{sample}.qc.tab'), 'w') as handle:
+        handle.write('#Position\tReads\tMean\t' + '\t'.join(f'Q{q}' for q in quantiles) + '\n')
+        for position, (reads, mean) in enumerate(zip(position_quality['reads'], position_quality['mean'])):
+            values = [str(position_quality['quantiles'][q][position]) for q in quantiles]
+            handle.write(f'{position + 1}\t{reads}\t{mean}\t' + '\t'.join(values) + '\n')
+
+
+def write_summary(profiles: Dict[str, dict], path: str):
+    """Write one line per sample with read count, mean length, GC content,
+    N rate and the median quality of the first and last position.
+    """
+    columns: List[str] = ['#Sample', 'Reads', 'MeanLength', 'GC', 'NRate', 'MedianQualityFirst',
+                          'MedianQualityLast']
+    with open(path, 'w') as handle:
+        handle.write('\t'.join(columns) + '\n')
+        for sample, profile in sorted(profiles.items()):
+            medians = profile['position_quality']['quantiles'].get('0.5') or [0]
+            handle.write(f"{sample}\t{profile['reads']}\t{profile['mean_length']:.1f}\t{profile['gc_content']:.4f}"
+                         f"\t{profile['n_rate']:.6f}\t{medians[0]}\t{medians[-1]}\n")
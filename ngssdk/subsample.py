@@ -0,0 +1,174 @@
+"""Reproducible subsampling of fastq files and read pairs in one streaming pass.
+
+A fixed number of reads is drawn with reservoir sampling, a fraction of reads
+is selected by hashing the read name with the seed.  Both are deterministic for
+a given seed; fraction sampling selects the same mates from R1 and R2 because
+they share the read name.
+"""
+
+import concurrent.futures
+import gzip
+import hashlib
+import math
+import os
+import random
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ngssdk.checks import has_illumina_read_naming_scheme
+from ngssdk.fastq import MatePair, FastqRecord, iter_fastq, iter_fastq_pairs, write_fastq
+
+FASTQ_EXTENSIONS = ('.fastq', '.fastq.gz')
+
+_HASH_RANGE: int = 1 << 64
+
+
+def read_name(record: FastqRecord) -> bytes:
+    """The read id up to the first space, which is identical for both mates."""
+    return record.id.partition(b" ")[0]
+
+
+def hash_fraction_filter(items: Iterable, fraction: float, seed: int = 0, key=read_name) -> Iterator:
+    """Yield the items whose hashed key falls below fraction.
+    key maps an item to the bytes that are hashed.
+    """
+    if not 0 <= fraction <= 1:
+        raise ValueError(f"fraction must be between 0 and 1; got {fraction!r}")
+    threshold: int = int(fraction * _HASH_RANGE)
+    salt: bytes = seed.to_bytes(8, "little", signed=True)
+    for item in items:
+        digest = hashlib.blake2b(key(item), digest_size=8, salt=salt).digest()
+        if int.from_bytes(digest, "little") < threshold:
+            yield item
+
+
+def reservoir_sample(items: Iterable, n: int, seed: int = 0) -> List:
+    """Draw n items uniformly without replacement in one pass (Algorithm L).
+    The sample keeps the order of the input.  Only O(n log(N/n)) random numbers
+    are drawn for N items.
+    """
+    if n < 0:
+        raise ValueError(f"n must not be negative; got {n!r}")
+    rng = random.Random(seed)
+    iterator = enumerate(items)
+    reservoir: List[Tuple[int, object]] = [item for _, item in zip(range(n), iterator)]
+    if n == 0 or len(reservoir) < n:
+        return [item for _, item in reservoir]
+
+    # random() may return 0.0 but never 1.0, so the logarithms are taken of 1.0 - random()
+    w = math.exp(math.log(1.0 - rng.random()) / n)
+    while True:
+        # w rounds to 1.0 only for very large n; every item is taken then
+        skip = int(math.log(1.0 - rng.random()) / math.log1p(-w)) if w < 1.0 else 0
+        for _ in range(skip):
+            if next(iterator, None) is None:
+                return [item for _, item in sorted(reservoir, key=lambda indexed: indexed[0])]
+        selected = next(iterator, None)
+        if selected is None:
+            return [item for _, item in sorted(reservoir, key=lambda indexed: indexed[0])]
+        reservoir[rng.randrange(n)] = selected
+        w *= math.exp(math.log(1.0 - rng.random()) / n)
+
+
+def _select(items: Iterable, reads: Optional[int], fraction: Optional[float], seed: int, key) -> Iterable:
+    if (reads is None) == (fraction is None):
+        raise ValueError("Give either reads or fraction")
+    if reads is not None:
+        return reservoir_sample(items, reads, seed)
+    return hash_fraction_filter(items, fraction, seed, key)
+
+
+def _open_output(path: str) -> BinaryIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb", compresslevel=1)
+    return open(path, "wb")
+
+
+def subsample_fastq(input_path: str, output_path: str, reads: Optional[int] = None,
+                    fraction: Optional[float] = None, seed: int = 0) -> int:
+    """Write a subsample of a single-end fastq file; give either a number of
+    reads or a fraction.  Output ending with .gz is compressed.
+    Return the number of written reads.
+    """
+    records = _select(iter_fastq(input_path, engine="bytes"), reads, fraction, seed, read_name)
+    with _open_output(output_path) as handle:
+        return write_fastq(handle, records)
+
+
+def subsample_fastq_pair(r1_path: str, r2_path: str, r1_output_path: str, r2_output_path: str,
+                         reads: Optional[int] = None, fraction: Optional[float] = None, seed: int = 0) -> int:
+    """Write a subsample of the read pairs of R1 and R2 in one pass over both
+    files; give either a number of pairs or a fraction.
+    Return the number of written pairs.
+    """
+    pairs = _select(iter_fastq_pairs(r1_path, r2_path), reads, fraction, seed, _pair_name)
+    count: int = 0
+    with _open_output(r1_output_path) as r1_handle, _open_output(r2_output_path) as r2_handle:
+        batch: List[MatePair] = []
+        for pair in pairs:
+            batch.append(pair)
+            if len(batch) >= 10_000:
+                count += _write_pairs(r1_handle, r2_handle, batch)
+                batch = []
+        count += _write_pairs(r1_handle, r2_handle, batch)
+    return count
+
+
+def _pair_name(pair: MatePair) -> bytes:
+    return read_name(pair.r1)
+
+
+def _write_pairs(r1_handle: BinaryIO, r2_handle: BinaryIO, pairs: List[MatePair]) -> int:
+    write_fastq(r1_handle, (pair.r1 for pair in pairs))
+    write_fastq(r2_handle, (pair.r2 for pair in pairs))
+    return len(pairs)
+
+
+def find_read_files(directory: str) -> List[Tuple[str, Optional[str]]]:
+    """Return (R1, R2) path tuples of the Illumina read files in a directory.
+    R2 is None for single-end data.  If both a .fastq and a .fastq.gz version of
+    a file exist, the uncompressed one is used.
+    """
+    files: Dict[str, str] = {}
+    for node in sorted(os.listdir(directory)):  # .fastq sorts before .fastq.gz
+        if os.path.isfile(os.path.join(directory, node)) and has_illumina_read_naming_scheme(node,
+                                                                                              FASTQ_EXTENSIONS):
+            key = node[:-3] if node.endswith(".gz") else node
+            files.setdefault(key, node)
+
+    pairs = []
+    for key, node in sorted(files.items()):
+        if "_R1_" not in key:
+            continue
+        mate = files.get(key.replace("_R1_", "_R2_"))
+        pairs.append((os.path.join(directory, node), os.path.join(directory, mate) if mate else None))
+    return pairs
+
+
+def _subsample_files(files: Tuple[str, Optional[str]], output_directory: str, reads: Optional[int],
+                     fraction: Optional[float], seed: int) -> Tuple[str, int]:
+    r1_path, r2_path = files
+    r1_output = os.path.join(output_directory, _uncompressed_name(r1_path))
+    if r2_path is None:
+        return r1_output, subsample_fastq(r1_path, r1_output, reads, fraction, seed)
+    r2_output = os.path.join(output_directory, _uncompressed_name(r2_path))
+    return r1_output, subsample_fastq_pair(r1_path, r2_path, r1_output, r2_output, reads, fraction, seed)
+
+
+def _uncompressed_name(path: str) -> str:
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith(".gz") else name
+
+
+def subsample_directory(input_directory: str, output_directory: str, reads: Optional[int] = None,
+                        fraction: Optional[float] = None, seed: int = 0,
+                        workers: Optional[int] = None) -> Dict[str, int]:
+    """Subsample every Illumina read file (pair) of a directory in parallel.
+    Uncompressed fastq files with the original names are written to
+    output_directory.  Return the number of written reads per R1 output file.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    files = find_read_files(input_directory)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_subsample_files, pair, output_directory, reads, fraction, seed)
+                   for pair in files]
+        return dict(future.result() for future in futures)
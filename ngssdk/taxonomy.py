@@ -0,0 +1,82 @@
+"""Annotate OTU tables with the taxonomy assigned by SINA.
+
+The SINA metadata (`--meta-fmt csv`) is parsed once into a dict of sequence
+ID to lineage, then the OTU table is streamed and the lineage of every OTU is
+appended as last column.  Both inputs may be gzip compressed.
+"""
+
+import csv
+import gzip
+import io
+import re
+from typing import Dict, Iterable, Iterator, TextIO
+
+from ngssdk.compression import open_decompressed
+
+# Column of the lineage (lca_tax_slv) in the SINA metadata.
+SINA_TAXONOMY_COLUMN: int = 6
+
+# Domain to species; shorter lineages are padded with empty ranks.
+TAXONOMY_RANKS: int = 7
+
+TAXONOMY_HEADER: str = "taxonomy"
+
+# Quotes, brackets and the word "uncultured" are removed from lineages.
+_TAXONOMY_CLEANUP = re.compile(r'["\[\]]|uncultured')
+
+
+def clean_taxonomy(lineage: str) -> str:
+    """Remove quotes, brackets and "uncultured" from a lineage and pad it to
+    TAXONOMY_RANKS ranks.
+    """
+    lineage = _TAXONOMY_CLEANUP.sub("", lineage)
+    return lineage + ";" * max(0, TAXONOMY_RANKS - 1 - lineage.count(";"))
+
+
+def open_text(path: str) -> TextIO:
+    """Open a (possibly compressed) file for reading in text mode."""
+    return io.TextIOWrapper(open_decompressed(path), encoding="utf-8", newline="")
+
+
+def parse_sina_taxonomy(lines: Iterable[str], column: int = SINA_TAXONOMY_COLUMN) -> Dict[str, str]:
+    """Map the sequence IDs of SINA csv metadata to their cleaned lineage."""
+    taxonomy = {}
+    for fields in csv.reader(lines):
+        if fields:
+            taxonomy[fields[0]] = clean_taxonomy(fields[column] if len(fields) > column else "")
+    return taxonomy
+
+
+def read_sina_taxonomy(path: str, column: int = SINA_TAXONOMY_COLUMN) -> Dict[str, str]:
+    with open_text(path) as handle:
+        return parse_sina_taxonomy(handle, column)
+
+
+def annotate_otu_table(lines: Iterable[str], taxonomy: Dict[str, str]) -> Iterator[str]:
+    """Append a taxonomy column to the lines of an OTU table.
+    OTUs without lineage are passed on unchanged.
+    """
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    yield header.rstrip("\r\n") + "\t" + TAXONOMY_HEADER + "\n"
+    for line in lines:
+        line = line.rstrip("\r\n")
+        lineage = taxonomy.get(line.split("\t", 1)[0])
+        yield (line if lineage is None else line + "\t" + lineage) + "\n"
+
+
+def add_taxonomy(otu_table_path: str, sina_path: str, output_path: str) -> int:
+    """Write the OTU table with the SINA lineages appended to output_path,
+    gzip compressed if it ends with .gz.
+    Return the number of written lines including the header.
+    """
+    taxonomy = read_sina_taxonomy(sina_path)
+    written = 0
+    opener = gzip.open if output_path.endswith(".gz") else open
+    with open_text(otu_table_path) as table, opener(output_path, "wt", encoding="utf-8") as output:
+        for line in annotate_otu_table(table, taxonomy):
+            output.write(line)
+            written += 1
+    return written
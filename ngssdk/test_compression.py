@@ -0,0 +1,102 @@
+import gzip
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+from ngssdk.compression import *
+
+DATA = b"".join(b"@read%d\nACGTACGTAC\n+\nIIIIIIIIII\n" % i for i in range(5000))
+
+
+def bgzf_compress(data: bytes, block_size: int = 4096) -> bytes:
+    """Compress data into bgzf blocks followed by the empty end-of-file block."""
+    blocks = []
+    for start in range(0, len(data), block_size):
+        blocks.append(bgzf_block(data[start:start + block_size]))
+    blocks.append(bgzf_block(b""))
+    return b"".join(blocks)
+
+
+def bgzf_block(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", 6)
+    extra = b"BC" + struct.pack("<HH", 2, 18 + len(cdata) + 8 - 1)
+    return header + extra + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as handle:
+            handle.write(content)
+        return path
+
+    def test_detect_compression(self):
+        self.assertIsNone(detect_compression(self.write("plain.fastq", DATA)))
+        self.assertEqual(detect_compression(self.write("a.fastq.gz", gzip.compress(DATA))), "gzip")
+        self.assertEqual(detect_compression(self.write("b.fastq.gz", bgzf_compress(DATA))), "bgzf")
+
+    def test_open_decompressed(self):
+        multi_member = gzip.compress(DATA[:1000]) + gzip.compress(DATA[1000:])
+        for name, content in [("plain.fastq", DATA), ("a.fastq.gz", gzip.compress(DATA)),
+                              ("multi.fastq.gz", multi_member), ("b.fastq.gz", bgzf_compress(DATA))]:
+            with open_decompressed(self.write(name, content), threads=3) as handle:
+                self.assertEqual(handle.read(), DATA, name)
+
+    def test_truncated_gzip(self):
+        path = self.write("a.fastq.gz", gzip.compress(DATA)[:-100])
+        with self.assertRaises(EOFError):
+            with open_decompressed(path) as handle:
+                handle.read()
+
+    def test_close_before_end(self):
+        with open_decompressed(self.write("a.fastq.gz", gzip.compress(DATA * 10))) as handle:
+            self.assertEqual(handle.read(10), DATA[:10])
+        self.assertTrue(handle.closed)
+
+    def test_is_decompressed_version(self):
+        plain = self.write("a.fastq", DATA)
+        for name, content in [("a.fastq.gz", gzip.compress(DATA)), ("b.fastq.gz", bgzf_compress(DATA))]:
+            compressed = self.write(name, content)
+            self.assertTrue(is_decompressed_version(compressed, plain), name)
+            self.assertFalse(is_decompressed_version(compressed, self.write("partial.fastq", DATA[:-10])), name)
+            self.assertFalse(is_decompressed_version(compressed, self.write("changed.fastq", DATA[:-1] + b"x")),
+                             name)
+            self.assertFalse(is_decompressed_version(compressed, os.path.join(self.directory.name, "missing")))
+        # only the last member could be checked without inflating the others
+        multi_member = self.write("multi.fastq.gz", gzip.compress(DATA[:1000]) + gzip.compress(DATA[1000:]))
+        self.assertFalse(is_decompressed_version(multi_member, plain))
+        # the blocks of bgzip files are checked one by one
+        bgzf = self.write("b.fastq.gz", bgzf_compress(DATA))
+        self.assertFalse(is_decompressed_version(bgzf, self.write("tail.fastq", DATA[4096:])))
+        self.assertFalse(is_decompressed_version(bgzf, self.write("first.fastq", b"x" + DATA[1:])))
+        self.assertEqual(len(bgzf_trailers(bgzf)), len(DATA) // 4096 + 2)
+
+        last_block = DATA[len(DATA) // 4096 * 4096:]
+        self.assertEqual(gzip_trailer(self.write("c.gz", bgzf_compress(DATA))),
+                         (zlib.crc32(last_block), len(last_block)))
+
+
+    def test_may_be_decompressed_version(self):
+        for name, content in [("a.fastq.gz", gzip.compress(DATA)), ("b.fastq.gz", bgzf_compress(DATA))]:
+            compressed = self.write(name, content)
+            self.assertTrue(may_be_decompressed_version(compressed, self.write("a.fastq", DATA)), name)
+            # only sizes are compared
+            self.assertTrue(may_be_decompressed_version(compressed, self.write("a.fastq", DATA[:-1] + b"x")), name)
+            # a partial file larger than the last bgzip block
+            self.assertFalse(may_be_decompressed_version(compressed, self.write("a.fastq", DATA[:-5000])), name)
+            # older than the gzip file
+            os.utime(self.write("a.fastq", DATA), (0, 0))
+            self.assertFalse(may_be_decompressed_version(compressed, os.path.join(self.directory.name, "a.fastq")))
+
+if __name__ == '__main__':
+    unittest.main()
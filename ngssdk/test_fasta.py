@@ -0,0 +1,65 @@
+import io
+import os
+import tempfile
+import unittest
+
+from ngssdk.custom_exceptions import FastaFormatError
+from ngssdk.fasta import *
+
+FASTA = (b">Uniq1;size=120;\nACGTACGT\nACG\n"
+         b">sample_0;barcodelabel=sample;size=7;\nTTTT\n"
+         b">Otu3 some description\nGG\nCC\nAA\n")
+
+
+class Test(unittest.TestCase):
+    def test_iter_fasta_from_binary_handle(self):
+        records = list(iter_fasta_from_binary_handle(io.BytesIO(FASTA)))
+        self.assertListEqual(records, [FastaRecord(b"Uniq1;size=120;", b"ACGTACGTACG"),
+                                       FastaRecord(b"sample_0;barcodelabel=sample;size=7;", b"TTTT"),
+                                       FastaRecord(b"Otu3 some description", b"GGCCAA")])
+        for chunk_size in range(1, len(FASTA) + 1):
+            self.assertListEqual(list(iter_fasta_from_binary_handle(io.BytesIO(FASTA), chunk_size)), records)
+
+        crlf = list(iter_fasta_from_binary_handle(io.BytesIO(FASTA.replace(b"\n", b"\r\n")), chunk_size=5))
+        self.assertListEqual(crlf, records)
+        self.assertListEqual(list(iter_fasta_from_binary_handle(io.BytesIO(b""))), [])
+        with self.assertRaises(FastaFormatError):
+            list(iter_fasta_from_binary_handle(io.BytesIO(b"ACGT\n")))
+
+    def test_annotations(self):
+        records = list(iter_fasta_from_binary_handle(io.BytesIO(FASTA)))
+        self.assertEqual(records[0].size, 120)
+        self.assertEqual(records[0].label, b"Uniq1")
+        self.assertIsNone(records[0].barcodelabel)
+        self.assertEqual(records[1].size, 7)
+        self.assertEqual(records[1].barcodelabel, b"sample")
+        self.assertIsNone(records[2].size)
+        self.assertEqual(records[2].label, b"Otu3")
+        self.assertEqual(size_annotation(b"Uniq1;size=5"), 5)
+
+    def test_write_fasta(self):
+        records = list(iter_fasta_from_binary_handle(io.BytesIO(FASTA)))
+        handle = io.BytesIO()
+        self.assertEqual(write_fasta(handle, records, batch_size=2), 3)
+        self.assertTrue(handle.getvalue().startswith(b">Uniq1;size=120;\nACGTACGTACG\n>sample_0"))
+        self.assertListEqual(list(iter_fasta_from_binary_handle(io.BytesIO(handle.getvalue()))), records)
+
+        self.assertEqual(format_fasta(records[:1], line_width=4), b">Uniq1;size=120;\nACGT\nACGT\nACG\n")
+
+    def test_select_and_trim_fasta(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "in.fasta")
+            with open(path, "wb") as handle:
+                handle.write(FASTA)
+
+            selected = os.path.join(directory, "selected.fasta")
+            self.assertEqual(select_fasta(path, selected, [b"Otu3", b"Uniq1;size=120;"]), 2)
+            self.assertEqual([record.label for record in iter_fasta(selected)], [b"Uniq1", b"Otu3"])
+
+            trimmed = os.path.join(directory, "trimmed.fasta")
+            self.assertEqual(trim_fasta(path, trimmed, forward_trim=1, reverse_trim=2), 3)
+            self.assertEqual([record.sequence for record in iter_fasta(trimmed)], [b"CGTACGTA", b"T", b"GCC"])
+
+
+if __name__ == '__main__':
+    unittest.main()
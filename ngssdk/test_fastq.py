@@ -0,0 +1,143 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import *
+
+FASTQ = (b"@read1 1:N:0:1\nACGT\n+\nIIII\n"
+         b"@read2 1:N:0:1\nGGCCA\n+read2\nII#II\n"
+         b"@read3 1:N:0:1\nT\n+\n@\n")
+
+
+class Test(unittest.TestCase):
+    def test_iter_fastq_from_binary_handle(self):
+        records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ)))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0], FastqRecord(b"read1 1:N:0:1", b"ACGT", b"IIII"))
+        self.assertEqual(records[1].subsequence(1, 3), b"GC")
+        # a quality line starting with '@' is not a header
+        self.assertEqual(records[2].quality, b"@")
+
+    def test_records_straddling_chunks(self):
+        expected = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ)))
+        for chunk_size in range(1, len(FASTQ) + 1):
+            records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ), chunk_size=chunk_size))
+            self.assertListEqual(records, expected)
+
+    def test_missing_final_newline_and_crlf(self):
+        records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ.rstrip(b"\n"))))
+        self.assertEqual(records[-1].quality, b"@")
+
+        records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ.replace(b"\n", b"\r\n")), chunk_size=7))
+        self.assertEqual(records[0], FastqRecord(b"read1 1:N:0:1", b"ACGT", b"IIII"))
+
+    def test_same_result_as_text_engine(self):
+        entries = list(iter_fastq_from_handle(io.StringIO(FASTQ.decode())))
+        records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ)))
+        for entry, record in zip(entries, records):
+            self.assertEqual(entry.id, record.id.decode())
+            self.assertEqual(entry.sequence, record.sequence.decode())
+            self.assertEqual(entry.quality, record.quality.decode())
+
+    def test_iter_fastq_columns(self):
+        records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ)))
+        columns = list(iter_fastq_columns_from_binary_handle(io.BytesIO(FASTQ), chunk_size=20))
+        self.assertListEqual([FastqRecord(*record) for chunk in columns for record in zip(*chunk)], records)
+        self.assertIs(type(records[0]), FastqRecord)
+
+    def test_malformed_input(self):
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_from_binary_handle(io.BytesIO(b"read1\nACGT\n+\nIIII\n")))
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_from_binary_handle(io.BytesIO(b"@read1\nACGT\n-\nIIII\n")))
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_from_binary_handle(io.BytesIO(b"@read1\nACGT\n+\nIII\n")))
+        # truncated last record
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ + b"@read4\nACGT\n")))
+
+    def test_iter_fastq(self):
+        with tempfile.TemporaryDirectory() as directory:
+            plain = os.path.join(directory, "sample.fastq")
+            compressed = os.path.join(directory, "sample.fastq.gz")
+            with open(plain, "wb") as handle:
+                handle.write(FASTQ)
+            with open(compressed, "wb") as handle:
+                handle.write(gzip.compress(FASTQ))
+
+            for path in (plain, compressed):
+                entries = list(iter_fastq(path))
+                self.assertEqual([entry.id for entry in entries], ["read1 1:N:0:1", "read2 1:N:0:1", "read3 1:N:0:1"])
+                records = list(iter_fastq(path, engine="bytes"))
+                self.assertEqual(records[1].sequence, b"GGCCA")
+
+        with self.assertRaises(ValueError):
+            iter_fastq(plain, engine="unknown")
+
+    def test_fastq_entry_has_no_dict(self):
+        entry = FastqEntry("read1", "ACGT", "IIII")
+        self.assertFalse(hasattr(entry, "__dict__"))
+        self.assertEqual(entry.subsequence(1, 3), "CG")
+
+    def test_fastq_batch(self):
+        records = list(iter_fastq_from_binary_handle(io.BytesIO(FASTQ)))
+        batch = FastqBatch.from_records(records)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch[1].id, b"read2 1:N:0:1")
+        self.assertEqual(batch[-1].sequence, b"T")
+        self.assertEqual(batch[1].subsequence(0, 2), b"GG")
+        self.assertEqual([(view.id, view.sequence, view.quality) for view in batch], [tuple(r) for r in records])
+        self.assertListEqual(list(batch.lengths()), [4, 5, 1])
+        with self.assertRaises(IndexError):
+            batch[3]
+
+        sliced = batch[1:]
+        self.assertEqual(len(sliced), 2)
+        self.assertEqual(sliced[0].quality, b"II#II")
+
+        # entries holding str are accepted as well
+        self.assertEqual(FastqBatch.from_records([FastqEntry("a", "AC", "II")])[0].sequence, b"AC")
+
+    def test_fastq_batch_subsequence(self):
+        batch = FastqBatch.from_records(iter_fastq_from_binary_handle(io.BytesIO(FASTQ)))
+        cut = batch.subsequence(1, 3)
+        self.assertEqual([view.sequence for view in cut], [b"CG", b"GC", b""])
+        self.assertEqual([view.quality for view in cut], [b"II", b"I#", b""])
+        self.assertEqual(cut[2].id, b"read3 1:N:0:1")
+
+    def test_iter_fastq_batches(self):
+        fastq = FASTQ * 5
+        batches = list(iter_fastq_batches_from_binary_handle(io.BytesIO(fastq), batch_size=4, chunk_size=10))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 4, 3])
+        expected = list(iter_fastq_from_binary_handle(io.BytesIO(fastq)))
+        self.assertEqual([(view.id, view.sequence, view.quality) for batch in batches for view in batch],
+                         [tuple(record) for record in expected])
+
+    def test_iter_fastq_pairs(self):
+        r1 = FASTQ * 3
+        r2 = FASTQ.replace(b" 1:N:0:1", b" 2:N:0:1") * 3
+        pairs = list(iter_fastq_pairs_from_binary_handles(io.BytesIO(r1), io.BytesIO(r2), chunk_size=7))
+        self.assertEqual(len(pairs), 9)
+        self.assertEqual(pairs[4].r1.id, b"read2 1:N:0:1")
+        self.assertEqual(pairs[4].r2.id, b"read2 2:N:0:1")
+        self.assertEqual(pairs[4].r2.sequence, b"GGCCA")
+
+        # different record counts
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_pairs_from_binary_handles(io.BytesIO(r1), io.BytesIO(FASTQ)))
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_pairs_from_binary_handles(io.BytesIO(FASTQ), io.BytesIO(r2)))
+
+        # disagreeing read ids
+        with self.assertRaises(FastqFormatError):
+            list(iter_fastq_pairs_from_binary_handles(io.BytesIO(r1), io.BytesIO(r2.replace(b"read3", b"read4"))))
+        pairs = iter_fastq_pairs_from_binary_handles(io.BytesIO(r1), io.BytesIO(r2.replace(b"read3", b"read4")),
+                                                     check_ids=False)
+        self.assertEqual(len(list(pairs)), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from ngssdk.index import *
+
+FASTQ = b"".join(b"@read%d\n%s\n+\n%s\n" % (i, b"A" * (i % 7), b"I" * (i % 7)) for i in range(100))
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sample.fastq")
+        with open(self.path, "wb") as handle:
+            handle.write(FASTQ)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_build_index(self):
+        expected = [FASTQ.index(b"@read%d\n" % i) for i in range(0, 100, 8)]
+        for chunk_size in (1, 5, 64, 1 << 20):
+            index = build_index(self.path, interval=8, chunk_size=chunk_size)
+            self.assertEqual(index.count, 100)
+            self.assertListEqual(list(index.offsets), expected, chunk_size)
+
+    def test_missing_final_newline(self):
+        with open(self.path, "wb") as handle:
+            handle.write(FASTQ.rstrip(b"\n"))
+        index = build_index(self.path, interval=3, chunk_size=10)
+        self.assertEqual(index.count, 100)
+        self.assertEqual(index.offsets[-1], FASTQ.index(b"@read99\n"))
+
+    def test_load_index(self):
+        self.assertEqual(count_records(self.path), 100)
+        self.assertTrue(os.path.isfile(self.path + INDEX_EXTENSION))
+        index = FastqIndex.load(self.path + INDEX_EXTENSION)
+        self.assertTrue(index.matches(self.path))
+        self.assertEqual(index.count, 100)
+
+        # a changed file invalidates the index
+        with open(self.path, "ab") as handle:
+            handle.write(b"@read100\nA\n+\nI\n")
+        self.assertFalse(index.matches(self.path))
+        self.assertEqual(count_records(self.path), 101)
+
+    def test_iter_fastq_from_record(self):
+        index = build_index(self.path, interval=8)
+        for record in (0, 7, 8, 9, 99):
+            first = next(iter_fastq_from_record(self.path, record, index))
+            self.assertEqual(first.id, b"read%d" % record)
+        with self.assertRaises(IndexError):
+            next(iter_fastq_from_record(self.path, 100, index))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from ngssdk.merge import *
+
+
+class Test(unittest.TestCase):
+    def test_relabel_header(self):
+        self.assertEqual(relabel_header(b">Uniq1;size=12;\n", b"S1", 0), b">S1_0;barcodelabel=S1;size=12;\n")
+        self.assertEqual(relabel_header(b">read\n", b"S1", 3), b">S1_3;barcodelabel=S1\n")
+
+    def test_merge_fasta_folder(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            unique = os.path.join(tmp, "unique")
+            os.mkdir(unique)
+            with open(os.path.join(unique, "S2.fasta"), "wb") as handle:
+                handle.write(b">Uniq1;size=3;\nACGT\nAC\n>Uniq2;size=1;\nGGGG\n")
+            with gzip.open(os.path.join(unique, "S1.fasta.gz"), "wb") as handle:
+                handle.write(b">Uniq1;size=5;\nTTTT\n")
+            with open(os.path.join(unique, ".hidden"), "wb") as handle:
+                handle.write(b">x\nA\n")
+
+            merged = os.path.join(tmp, "merged.fasta")
+            counts = merge_fasta_folder(unique, merged, workers=2)
+
+            self.assertDictEqual(counts, {"S1": (1, 5), "S2": (2, 4)})
+            with open(merged, "rb") as handle:
+                self.assertEqual(handle.read(), b">S1_0;barcodelabel=S1;size=5;\nTTTT\n"
+                                                b">S2_0;barcodelabel=S2;size=3;\nACGT\nAC\n"
+                                                b">S2_1;barcodelabel=S2;size=1;\nGGGG\n")
+            self.assertListEqual(sorted(os.listdir(tmp)), ["merged.fasta", "unique"])
+
+
+if __name__ == '__main__':
+    unittest.main()
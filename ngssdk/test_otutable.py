@@ -0,0 +1,80 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ngssdk.custom_exceptions import OtuTableFormatError
+from ngssdk.otutable import *
+
+TABLE = ("#OTU ID\tS1\tS2\tS3\ttaxonomy\n"
+         "OTU_1\t10\t0\t0\tBacteria;Firmicutes;;;;;\n"
+         "OTU_2\t0\t0\t0\tBacteria;;;;;;\n"
+         "OTU_3\t5\t3\t0\n"
+         "OTU_4\t0\t1\t4\tBacteria;Bacteroidetes;;;;;\n")
+
+COUNTS = [[10, 0, 0], [0, 0, 0], [5, 3, 0], [0, 1, 4]]
+
+
+class Test(unittest.TestCase):
+    def test_parse_otu_table(self):
+        table = parse_otu_table(TABLE.splitlines(keepends=True), batch_size=3)
+        self.assertEqual(table.shape, (4, 3))
+        self.assertEqual(table.nnz, 5)
+        self.assertListEqual(table.otu_ids, ["OTU_1", "OTU_2", "OTU_3", "OTU_4"])
+        self.assertListEqual(table.sample_ids, ["S1", "S2", "S3"])
+        self.assertListEqual(table.taxonomy[2:], ["", "Bacteria;Bacteroidetes;;;;;"])
+        self.assertListEqual(table.to_dense().tolist(), COUNTS)
+        self.assertListEqual(table.sample_sizes().tolist(), [15, 4, 4])
+        self.assertListEqual(table.otu_sizes().tolist(), [10, 0, 8, 5])
+
+    def test_parse_errors(self):
+        with self.assertRaises(OtuTableFormatError):
+            parse_otu_table(["#OTU ID\tS1\tS2\n", "OTU_1\t1\n"])
+        with self.assertRaises(OtuTableFormatError):
+            parse_otu_table(["#OTU ID\tS1\tS2\n", "OTU_1\t1\tx\n"])
+        with self.assertRaises(OtuTableFormatError):
+            parse_otu_table([])
+
+    def test_csc_and_selection(self):
+        table = OtuTable.from_dense(np.array(COUNTS), ["OTU_1", "OTU_2", "OTU_3", "OTU_4"], ["S1", "S2", "S3"])
+        indptr, rows, data = table.to_csc()
+        self.assertListEqual(indptr.tolist(), [0, 2, 4, 5])
+        self.assertListEqual(rows.tolist(), [0, 2, 2, 3, 3])
+        self.assertListEqual(data.tolist(), [10, 5, 3, 1, 4])
+
+        selected = table.select_otus(np.array([True, False, False, True]))
+        self.assertListEqual(selected.otu_ids, ["OTU_1", "OTU_4"])
+        self.assertListEqual(selected.to_dense().tolist(), [[10, 0, 0], [0, 1, 4]])
+
+        scaled = table.scale_samples([0.5, 1, 2], dtype=np.float32)
+        self.assertEqual(scaled.data.dtype, np.float32)
+        self.assertListEqual(scaled.to_dense()[3].tolist(), [0, 1, 8])
+
+        np.testing.assert_allclose(table.max_relative_abundance(), [10 / 15, 0, 3 / 4, 1])
+
+    def test_filter_relative_abundance(self):
+        table = parse_otu_table(TABLE.splitlines(keepends=True))
+        result = filter_relative_abundance(table, 0.7)
+        self.assertListEqual(result.table.otu_ids, ["OTU_3", "OTU_4"])
+        self.assertListEqual(result.table.taxonomy, ["", "Bacteria;Bacteroidetes;;;;;"])
+        self.assertListEqual(result.sample_sizes.tolist(), [15, 4, 4])
+        self.assertListEqual(result.filtered_sample_sizes.tolist(), [5, 4, 4])
+        # the cutoff itself is not enough
+        self.assertListEqual(filter_relative_abundance(table, 0.75).table.otu_ids, ["OTU_4"])
+
+    def test_roundtrip(self):
+        table = parse_otu_table(TABLE.splitlines(keepends=True))
+        self.assertEqual("".join(format_otu_table(table)), TABLE.replace("OTU_3\t5\t3\t0\n", "OTU_3\t5\t3\t0\t\n"))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "table.tab.gz")
+            self.assertEqual(save_otu_table(table.scale_samples([0.5, 1, 1]), path), 4)
+            with gzip.open(path, "rt") as handle:
+                self.assertEqual(handle.readlines()[1], "OTU_1\t5.0\t0.0\t0.0\tBacteria;Firmicutes;;;;;\n")
+            self.assertListEqual(read_otu_table(path).to_dense()[0].tolist(), [5, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
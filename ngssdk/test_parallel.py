@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from ngssdk.parallel import *
+
+# quality lines starting with '@' must not be mistaken for headers
+FASTQ = b"".join(b"@read%d\nACGTA\n+\n@@III\n" % i for i in range(1000))
+
+
+def count_records(records) -> int:
+    return sum(1 for _ in records)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sample.fastq")
+        with open(self.path, "wb") as handle:
+            handle.write(FASTQ)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_find_record_start(self):
+        record_length = len(b"@read0\nACGTA\n+\n@@III\n")
+        with open(self.path, "rb") as handle:
+            self.assertEqual(find_record_start(handle, 0), 0)
+            self.assertEqual(find_record_start(handle, record_length), record_length)
+            for offset in range(1, record_length):
+                start = find_record_start(handle, offset)
+                self.assertEqual(start, record_length, offset)
+            self.assertEqual(find_record_start(handle, len(FASTQ) - 3), len(FASTQ))
+
+    def test_iter_fastq_range(self):
+        ranges = [(0, 200), (200, 500), (500, len(FASTQ))]
+        with open(self.path, "rb") as handle:
+            ranges = [(find_record_start(handle, start), find_record_start(handle, end)) for start, end in ranges]
+        ids = [record.id for byte_range in ranges for record in iter_fastq_range(self.path, byte_range)]
+        self.assertListEqual(ids, [b"read%d" % i for i in range(1000)])
+
+    def test_split_fastq(self):
+        self.assertListEqual(split_fastq(self.path, 4), [(0, len(FASTQ))])
+
+        ranges = split_fastq(self.path, 7, min_range_size=1)
+        self.assertEqual(len(ranges), 7)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(FASTQ))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+        ids = [record.id for byte_range in ranges for record in iter_fastq_range(self.path, byte_range)]
+        self.assertListEqual(ids, [b"read%d" % i for i in range(1000)])
+
+    def test_map_fastq_chunks(self):
+        self.assertEqual(map_fastq_chunks(self.path, count_records, reduce=lambda a, b: a + b, workers=2), 1000)
+        self.assertListEqual(map_fastq_chunks(self.path, count_records, workers=2), [1000])
+
+
+if __name__ == '__main__':
+    unittest.main()
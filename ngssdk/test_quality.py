@@ -0,0 +1,40 @@
+import math
+import unittest
+
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import FastqBatch
+from ngssdk.quality import *
+
+# qualities: 40 40 10 20 / 2 30 / (empty) / 30 30 30
+BATCH = FastqBatch.from_columns([b"r1", b"r2", b"r3", b"r4"], [b"ACGT", b"AC", b"", b"GGG"],
+                                [b"II+5", b"#?", b"", b"???"])
+
+
+class Test(unittest.TestCase):
+    def test_decode_qualities(self):
+        self.assertListEqual(decode_qualities(BATCH).tolist(), [40, 40, 10, 20, 2, 30, 30, 30, 30])
+        with self.assertRaises(FastqFormatError):
+            decode_qualities(FastqBatch.from_columns([b"r"], [b"A"], [b" "]))
+
+    def test_quality_matrix(self):
+        matrix = quality_matrix(BATCH)
+        self.assertEqual(matrix.dtype, np.uint8)
+        self.assertListEqual(matrix.tolist(), [[40, 40, 10, 20], [2, 30, 0, 0], [0, 0, 0, 0], [30, 30, 30, 0]])
+
+    def test_summarize_qualities(self):
+        summary = summarize_qualities(BATCH, truncation_quality=10)
+        self.assertListEqual(summary.lengths.tolist(), [4, 2, 0, 3])
+
+        expected = [2 * 1e-4 + 1e-1 + 1e-2, 10 ** -0.2 + 1e-3, 0, 3e-3]
+        for value, reference in zip(summary.expected_errors, expected):
+            self.assertTrue(math.isclose(value, reference, abs_tol=1e-12))
+        self.assertTrue(math.isclose(summary.expected_error_rates[0], expected[0] / 4))
+        self.assertEqual(summary.expected_error_rates[2], 0)
+
+        self.assertListEqual(summary.mean_qualities.tolist(), [27.5, 16.0, 0.0, 30.0])
+        self.assertListEqual(summary.truncation_positions.tolist(), [2, 0, 0, 3])
+        self.assertTrue(np.array_equal(expected_errors(BATCH), summary.expected_errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
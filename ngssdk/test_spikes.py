@@ -0,0 +1,111 @@
+import os
+import random
+import tempfile
+import unittest
+
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import FastqBatch, iter_fastq, iter_fastq_pairs
+from ngssdk.spikes import *
+
+random.seed(1)
+SPIKE = bytes(random.choice(b"ACGT") for _ in range(300))
+OTHER = bytes(random.choice(b"ACGT") for _ in range(300))
+
+
+def reverse_complement(sequence: bytes) -> bytes:
+    return sequence.translate(bytes.maketrans(b"ACGT", b"TGCA"))[::-1]
+
+
+def batch(*sequences: bytes) -> FastqBatch:
+    return FastqBatch.from_columns([b"r%d" % i for i in range(len(sequences))], list(sequences),
+                                   [b"I" * len(sequence) for sequence in sequences])
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.screen = KmerScreen.from_sequences([SPIKE], k=21, stride=1)
+
+    def test_kmer_codes(self):
+        codes, valid = kmer_codes(b"ACGTN", 2)
+        self.assertListEqual(codes.tolist(), [0b0001, 0b0111, 0b1110, 0b1000])
+        self.assertListEqual(valid.tolist(), [True, True, True, False])
+        self.assertEqual(len(kmer_codes(b"AC", 3)[0]), 0)
+
+    def test_classify(self):
+        mixed = SPIKE[:30] + OTHER[:120]
+        with_n = SPIKE[:100] + b"N" + SPIKE[101:200]
+        classes = self.screen.classify(batch(SPIKE[50:200], reverse_complement(SPIKE[:150]), OTHER[:150], mixed,
+                                             with_n, b"ACG", SPIKE[:150].lower()))
+        self.assertListEqual(classes.tolist(), [LIKELY_SPIKE, LIKELY_SPIKE, NOT_SPIKE, AMBIGUOUS, LIKELY_SPIKE,
+                                                NOT_SPIKE, LIKELY_SPIKE])
+
+    def test_invalid_bases(self):
+        # every k-mer touching the N or the IUPAC code is skipped
+        found, total = self.screen.hits(batch(SPIKE[:40] + b"N" + SPIKE[41:80] + b"R" + SPIKE[81:100]))
+        self.assertListEqual(total.tolist(), [100 - 21 + 1 - 21 - 20])
+        self.assertListEqual(found.tolist(), total.tolist())
+
+    def test_no_kmers_span_reads(self):
+        # the end of one read and the start of the next form a spike k-mer
+        found, total = self.screen.hits(batch(OTHER[:50] + SPIKE[:10], SPIKE[10:20] + OTHER[:50]))
+        self.assertListEqual(found.tolist(), [0, 0])
+        self.assertListEqual(total.tolist(), [40, 40])
+
+    def test_stride(self):
+        screen = KmerScreen.from_sequences([SPIKE])
+        # every exact match of k + stride - 1 bases is found, wherever it starts in the read
+        for offset in range(DEFAULT_STRIDE):
+            read = OTHER[:offset] + SPIKE[100:100 + DEFAULT_K + DEFAULT_STRIDE - 1] + OTHER[200:230]
+            found, total = screen.hits(batch(read))
+            self.assertGreater(found[0], 0)
+            self.assertEqual(total[0], (len(read) - DEFAULT_K) // DEFAULT_STRIDE + 1)
+        self.assertListEqual(screen.hits(batch(OTHER[:150]))[0].tolist(), [0])
+
+    def test_split_fastq_pair(self):
+        self.screen = KmerScreen.from_sequences([SPIKE])
+        with tempfile.TemporaryDirectory() as directory:
+            r1 = os.path.join(directory, "r1.fastq")
+            r2 = os.path.join(directory, "r2.fastq")
+            with open(r1, "wb") as r1_handle, open(r2, "wb") as r2_handle:
+                for i in range(100):
+                    sequence = SPIKE[i:i + 150] if i % 3 == 0 else OTHER[i:i + 150]
+                    r1_handle.write(b"@r%d 1\n%s\n+\n%s\n" % (i, sequence, b"I" * 150))
+                    # longer headers and Windows line ends shift the R2 records against R1
+                    r2_handle.write(b"@r%d 2:N:0:ACGT\r\n%s\r\n+\r\n%s\r\n" % (i, reverse_complement(sequence),
+                                                                                  b"I" * 150))
+            candidates = (os.path.join(directory, "c1.fastq"), os.path.join(directory, "c2.fastq"))
+            clean = (os.path.join(directory, "n1.fastq"), os.path.join(directory, "n2.fastq"))
+            counts = split_fastq_pair(r1, r2, self.screen, {NOT_SPIKE: clean, AMBIGUOUS: candidates,
+                                                            LIKELY_SPIKE: candidates}, chunk_size=1000)
+            self.assertListEqual(counts, [66, 0, 34])
+            with open(candidates[0], "rb") as handle:
+                self.assertTrue(handle.read().startswith(b"@r0 1\n%s\n+\n" % SPIKE[:150]))
+            self.assertListEqual([record.id for record in iter_fastq(candidates[0], engine="bytes")],
+                                 [b"r%d 1" % i for i in range(0, 100, 3)])
+            self.assertListEqual([record.id for record in iter_fastq(clean[1], engine="bytes")],
+                                 [b"r%d 2:N:0:ACGT" % i for i in range(100) if i % 3])
+
+    def test_split_without_final_newline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            r1 = os.path.join(directory, "r1.fastq")
+            r2 = os.path.join(directory, "r2.fastq")
+            records = b"".join(b"@r%d\n%s\n+\n%s\n" % (i, SPIKE[i % 150:i % 150 + 150], b"I" * 150)
+                              for i in range(300))
+            for path in (r1, r2):
+                with open(path, "wb") as handle:
+                    handle.write(records[:-1])
+            self.assertEqual(len(list(iter_fastq_pairs(r1, r2))), 300)
+            outputs = (os.path.join(directory, "o1.fastq"), os.path.join(directory, "o2.fastq"))
+            counts = split_fastq_pair(r1, r2, self.screen, {LIKELY_SPIKE: outputs}, chunk_size=1000)
+            self.assertListEqual(counts, [0, 0, 300])
+            with open(outputs[1], "rb") as handle:
+                self.assertEqual(handle.read(), records)
+
+            with open(r2, "wb") as handle:
+                handle.write(records[:-200])
+            with self.assertRaises(FastqFormatError):
+                split_fastq_pair(r1, r2, self.screen, {LIKELY_SPIKE: outputs})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from ngssdk.custom_exceptions import FastqFormatError
+from ngssdk.fastq import FastqBatch
+from ngssdk.stats import *
+
+# qualities: 40 40 10 20 / 2 30 / 30 30 30
+BATCH = FastqBatch.from_columns([b"r1", b"r2", b"r3"], [b"ACGT", b"NC", b"GGG"], [b"II+5", b"#?", b"???"])
+
+
+class Test(unittest.TestCase):
+    def test_fastq_profile(self):
+        profile = FastqProfile()
+        profile.add(BATCH)
+        summary = profile.to_dict(quantiles=(0.5,))
+        self.assertEqual(summary['reads'], 3)
+        self.assertEqual(summary['bases'], 9)
+        self.assertEqual(summary['mean_length'], 3.0)
+        self.assertDictEqual(summary['length_histogram'], {2: 1, 3: 1, 4: 1})
+        self.assertAlmostEqual(summary['gc_content'], 6 / 8)
+        self.assertAlmostEqual(summary['n_rate'], 1 / 9)
+        self.assertListEqual(summary['position_quality']['reads'], [3, 3, 2, 1])
+        self.assertListEqual(summary['position_quality']['mean'], [24.0, 33.33, 20.0, 20.0])
+        self.assertListEqual(summary['position_quality']['quantiles']['0.5'], [30, 30, 10, 20])
+
+    def test_merge(self):
+        merged = FastqProfile()
+        merged.add(BATCH[:1])
+        other = FastqProfile()
+        other.add(BATCH[1:])
+        merged.merge(other)
+
+        whole = FastqProfile()
+        whole.add(BATCH)
+        self.assertDictEqual(merged.to_dict(), whole.to_dict())
+
+    def test_profile_files(self):
+        fastq = b"@r1\nACGT\n+\nII+5\n@r2\nNC\n+\n#?\n"
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "A_S1_L001_R1_001.fastq"), "wb") as handle:
+                handle.write(fastq)
+            with open(os.path.join(directory, "A_S1_L001_R1_001.fastq.gz"), "wb") as handle:
+                handle.write(gzip.compress(fastq + fastq))
+            with open(os.path.join(directory, "B_S2_L001_R1_001.fastq.gz"), "wb") as handle:
+                handle.write(gzip.compress(fastq))
+            with open(os.path.join(directory, "Undetermined.txt"), "wb") as handle:
+                handle.write(fastq)
+
+            samples = collect_fastq_files(directory)
+            self.assertDictEqual(samples, {"A_S1_L001_R1_001": os.path.join(directory, "A_S1_L001_R1_001.fastq"),
+                                           "B_S2_L001_R1_001": os.path.join(directory, "B_S2_L001_R1_001.fastq.gz")})
+
+            profiles = profile_files(samples, workers=2)
+            self.assertEqual(profiles["A_S1_L001_R1_001"]['reads'], 2)
+            self.assertEqual(profiles["B_S2_L001_R1_001"]['reads'], 2)
+
+            write_profile("B_S2_L001_R1_001", profiles["B_S2_L001_R1_001"], directory)
+            with open(os.path.join(directory, "B_S2_L001_R1_001.qc.json")) as handle:
+                self.assertEqual(json.load(handle)['bases'], 6)
+            with open(os.path.join(directory, "B_S2_L001_R1_001.qc.tab")) as handle:
+                lines = handle.readlines()
+            self.assertEqual(lines[0], "#Position\tReads\tMean\tQ0.1\tQ0.25\tQ0.5\tQ0.75\tQ0.9\n")
+            self.assertEqual(lines[1], "1\t2\t21.0\t2\t2\t2\t40\t40\n")
+
+            write_summary(profiles, os.path.join(directory, "summary.tab"))
+            with open(os.path.join(directory, "summary.tab")) as handle:
+                self.assertEqual(len(handle.readlines()), 3)
+
+            with open(os.path.join(directory, "C_S3_L001_R1_001.fastq"), "wb") as handle:
+                handle.write(fastq.replace(b"\n+\n", b"\n-\n"))
+            samples = collect_fastq_files(directory)
+            with self.assertRaises(FastqFormatError):
+                profile_files(samples)
+            with self.assertLogs(level='ERROR'):
+                profiles = profile_files(samples, skip_errors=True)
+            self.assertListEqual(sorted(profiles), ["A_S1_L001_R1_001", "B_S2_L001_R1_001"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from ngssdk.fastq import iter_fastq
+from ngssdk.subsample import *
+
+R1 = b"".join(b"@read%d 1:N:0:1\nACGT\n+\nIIII\n" % i for i in range(1000))
+R2 = b"".join(b"@read%d 2:N:0:1\nTTGG\n+\nIIII\n" % i for i in range(1000))
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.r1 = os.path.join(self.directory.name, "A_S1_L001_R1_001.fastq")
+        self.r2 = os.path.join(self.directory.name, "A_S1_L001_R2_001.fastq.gz")
+        with open(self.r1, "wb") as handle:
+            handle.write(R1)
+        with open(self.r2, "wb") as handle:
+            handle.write(gzip.compress(R2))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reservoir_sample(self):
+        sample = reservoir_sample(range(10000), 100, seed=1)
+        self.assertEqual(len(sample), 100)
+        self.assertEqual(len(set(sample)), 100)
+        self.assertListEqual(sample, sorted(sample))
+        self.assertListEqual(sample, reservoir_sample(range(10000), 100, seed=1))
+        self.assertNotEqual(sample, reservoir_sample(range(10000), 100, seed=2))
+        self.assertListEqual(reservoir_sample(range(5), 10), [0, 1, 2, 3, 4])
+        self.assertListEqual(reservoir_sample(range(5), 0), [])
+
+    def test_hash_fraction_filter(self):
+        items = [b"read%d" % i for i in range(10000)]
+        selected = list(hash_fraction_filter(items, 0.1, seed=3, key=lambda item: item))
+        self.assertTrue(800 < len(selected) < 1200)
+        self.assertListEqual(selected, list(hash_fraction_filter(items, 0.1, seed=3, key=lambda item: item)))
+        self.assertListEqual(list(hash_fraction_filter(items, 1, key=lambda item: item)), items)
+        with self.assertRaises(ValueError):
+            list(hash_fraction_filter(items, 2))
+
+    def test_subsample_fastq_pair(self):
+        r1_out = os.path.join(self.directory.name, "out_R1.fastq")
+        r2_out = os.path.join(self.directory.name, "out_R2.fastq")
+        self.assertEqual(subsample_fastq_pair(self.r1, self.r2, r1_out, r2_out, reads=50, seed=7), 50)
+        r1_names = [record.id.split()[0] for record in iter_fastq(r1_out, engine="bytes")]
+        r2_names = [record.id.split()[0] for record in iter_fastq(r2_out, engine="bytes")]
+        self.assertEqual(len(r1_names), 50)
+        self.assertListEqual(r1_names, r2_names)
+
+        count = subsample_fastq_pair(self.r1, self.r2, r1_out, r2_out, fraction=0.2, seed=7)
+        r1_names = [record.id.split()[0] for record in iter_fastq(r1_out, engine="bytes")]
+        r2_names = [record.id.split()[0] for record in iter_fastq(r2_out, engine="bytes")]
+        self.assertEqual(len(r1_names), count)
+        self.assertListEqual(r1_names, r2_names)
+
+        with self.assertRaises(ValueError):
+            subsample_fastq_pair(self.r1, self.r2, r1_out, r2_out)
+
+    def test_subsample_directory(self):
+        self.assertListEqual(find_read_files(self.directory.name), [(self.r1, self.r2)])
+        output = os.path.join(self.directory.name, "subsample")
+        counts = subsample_directory(self.directory.name, output, reads=10, workers=1)
+        self.assertDictEqual(counts, {os.path.join(output, "A_S1_L001_R1_001.fastq"): 10})
+        self.assertListEqual(sorted(os.listdir(output)), ["A_S1_L001_R1_001.fastq", "A_S1_L001_R2_001.fastq"])
+
+
+if __name__ == '__main__':
+    unittest.main()
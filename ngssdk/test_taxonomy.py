@@ -0,0 +1,51 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from ngssdk.taxonomy import *
+
+SINA = ('name,align_cutoff_head_slv,align_cutoff_tail_slv,align_filter_slv,align_quality_slv,align_startpos_slv,'
+        'lca_tax_slv\n'
+        'OTU_1,0,0,,99,1,"Bacteria;Firmicutes;Clostridia;[Eubacterium] coprostanoligenes group;uncultured;"\n'
+        'OTU_2,0,0,,98,1,Bacteria;Bacteroidetes;Bacteroidia;Bacteroidales;Muribaculaceae;Muribaculum;M. sp.\n'
+        'OTU_3,0,0,,0,1\n')
+
+TABLE = "#OTU ID\tS1\tS2\nOTU_1\t1\t0\nOTU_2\t0\t2\nOTU_4\t3\t3\n"
+
+
+class Test(unittest.TestCase):
+    def test_clean_taxonomy(self):
+        self.assertEqual(clean_taxonomy('"Bacteria;[Eubacterium] group;uncultured"'), "Bacteria;Eubacterium group;;;;;")
+        self.assertEqual(clean_taxonomy(""), ";;;;;;")
+        self.assertEqual(clean_taxonomy("a;b;c;d;e;f;g;h"), "a;b;c;d;e;f;g;h")
+
+    def test_parse_sina_taxonomy(self):
+        taxonomy = parse_sina_taxonomy(SINA.splitlines(keepends=True))
+        self.assertEqual(taxonomy["OTU_1"], "Bacteria;Firmicutes;Clostridia;Eubacterium coprostanoligenes group;;;")
+        self.assertEqual(taxonomy["OTU_2"],
+                         "Bacteria;Bacteroidetes;Bacteroidia;Bacteroidales;Muribaculaceae;Muribaculum;M. sp.")
+        self.assertEqual(taxonomy["OTU_3"], ";;;;;;")
+
+    def test_add_taxonomy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sina_path = os.path.join(tmp, "aligned.fasta.csv")
+            table_path = os.path.join(tmp, "table.tab.gz")
+            output_path = os.path.join(tmp, "annotated.tab")
+            with open(sina_path, "w") as handle:
+                handle.write(SINA)
+            with gzip.open(table_path, "wt") as handle:
+                handle.write(TABLE)
+
+            self.assertEqual(add_taxonomy(table_path, sina_path, output_path), 4)
+            with open(output_path) as handle:
+                self.assertListEqual(handle.readlines(), [
+                    "#OTU ID\tS1\tS2\ttaxonomy\n",
+                    "OTU_1\t1\t0\tBacteria;Firmicutes;Clostridia;Eubacterium coprostanoligenes group;;;\n",
+                    "OTU_2\t0\t2\tBacteria;Bacteroidetes;Bacteroidia;Bacteroidales;Muribaculaceae;Muribaculum;M. sp.\n",
+                    "OTU_4\t3\t3\n",
+                ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+"""Append the taxonomy assigned by SINA to an OTU table.
+
+The SINA csv metadata is read once into memory and the OTU table is streamed, without intermediate files.
+Inputs may be gzip compressed; the output is compressed if its name ends with .gz.
+"""
+
+import argparse
+import sys
+
+from ngssdk.taxonomy import add_taxonomy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add a taxonomy column to an OTU table.")
+    parser.add_argument('otu_table', type=str, help="OTU table")
+    parser.add_argument('sina_csv', type=str, help="SINA metadata written with --meta-fmt csv")
+    parser.add_argument('annotated_otu_table', type=str, help="output for the annotated OTU table")
+    args = parser.parse_args(argv)
+
+    written = add_taxonomy(args.otu_table, args.sina_csv, args.annotated_otu_table)
+    print(f"Annotated {max(0, written - 1)} OTUs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""Remove OTUs that do not exceed a relative abundance cutoff in any sample.
+
+The OTU table is read once into a sparse matrix; the filtered table, the list of kept OTUs and the
+sample sizes before and after filtering are all written from it.
+"""
+
+import argparse
+import sys
+
+from ngssdk.otutable import filter_relative_abundance, read_otu_table, save_otu_table
+
+
+def format_count(count):
+    count = float(count)
+    return str(int(count)) if count.is_integer() else repr(count)
+
+
+def write_sample_sizes(path, sample_ids, sample_sizes, filtered_sample_sizes):
+    with open(path, 'w') as sizes_h:
+        sizes_h.write("#SampleID\tunfiltered\tfiltered\n")
+        for sample_id, size, filtered_size in zip(sample_ids, sample_sizes, filtered_sample_sizes):
+            sizes_h.write(f"{sample_id}\t{format_count(size)}\t{format_count(filtered_size)}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Filter an OTU table by relative abundance.")
+    parser.add_argument('otu_table', type=str, help="OTU table (may be gzip compressed)")
+    parser.add_argument('filtered_otu_table', type=str, help="output for the filtered OTU table")
+    parser.add_argument('filtered_otu_list', type=str, help="output for the IDs of the kept OTUs")
+    parser.add_argument('cutoff', type=float, help="an OTU is kept if its relative abundance in any sample is above")
+    parser.add_argument('--sample-sizes', type=str, default=None,
+                        help="output for the sample sizes before and after filtering")
+    args = parser.parse_args(argv)
+
+    table = read_otu_table(args.otu_table)
+    result = filter_relative_abundance(table, args.cutoff)
+
+    save_otu_table(result.table, args.filtered_otu_table)
+    with open(args.filtered_otu_list, 'w') as list_h:
+        list_h.writelines(otu_id + "\n" for otu_id in result.table.otu_ids)
+    if args.sample_sizes:
+        write_sample_sizes(args.sample_sizes, table.sample_ids, result.sample_sizes, result.filtered_sample_sizes)
+
+    print(f"Kept {result.table.shape[0]} of {table.shape[0]} OTUs with a relative abundance above {args.cutoff}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
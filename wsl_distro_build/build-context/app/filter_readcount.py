@@ -1,82 +1,125 @@
 #!/usr/bin/env python3
 
+"""Remove samples with less reads than a cutoff from the stats, pairing and mapping files."""
+
 import logging
 import argparse as ap
+from concurrent.futures import ThreadPoolExecutor
+
+
+def filter_stats(stats_lines, cutoff, out_stats=None, out_removed=None):
+    """
+    Stream a readcount stats file and collect the IDs of samples with at least cutoff reads.
+
+    :param stats_lines: (iterable) lines of the stats file (ID, count)
+    :param cutoff: (int) minimal number of reads
+    :param out_stats: (file) optional handle for the lines of kept samples
+    :param out_removed: (file) optional handle for the IDs of removed samples
+    :return: (tuple) frozenset of kept IDs and the number of samples
+    """
+    good_samples = set()
+    number_of_samples = 0
+    for line in stats_lines:
+        if line.startswith('#'):
+            if out_stats is not None:
+                out_stats.write(line)
+            continue
 
-logging.basicConfig(
-    level=logging.DEBUG
-)
+        number_of_samples += 1
 
-parser = ap.ArgumentParser()
+        fields = line.split('\t')
+        count = int(fields[1])
 
-parser.add_argument('cutoff', type=int)
+        if count >= cutoff:
+            good_samples.add(fields[0])
+            if out_stats is not None:
+                out_stats.write(line)
+        elif out_removed is not None:
+            out_removed.write(fields[0] + "\n")
+    return frozenset(good_samples), number_of_samples
 
-parser.add_argument('readcountstatsfile', type=ap.FileType('r'))
-parser.add_argument('pairedfile', type=ap.FileType('r'))
-parser.add_argument('mappingfile', type=str)
 
-parser.add_argument('outstatsfiltered', type=ap.FileType('w'))
-parser.add_argument('outpairedfiltered', type=ap.FileType('w'))
-parser.add_argument('outmappingfilefiltered', type=str)
+def filter_table(lines, keep, column, out):
+    """
+    Stream a tab separated table and write comment lines and lines whose ID in column is in keep.
 
-parser.add_argument('filteredfiles', type=ap.FileType('w'))
+    :param lines: (iterable) lines of the table
+    :param keep: (frozenset) IDs to keep
+    :param column: (int) index of the ID column
+    :param out: (file) handle for the kept lines
+    :return: (int) number of kept lines, not counting comments
+    """
+    kept = 0
+    for line in lines:
+        if line.startswith('#') or line == "Forward\tReverse\tID\tfasta\n":
+            out.write(line)
+            continue
 
-args = parser.parse_args()
+        fields = line.split('\t')
+        if len(fields) > column and fields[column] in keep:
+            out.write(line)
+            kept += 1
+    return kept
 
 
-# filter stats file and identify matching IDs
-good_samples = []
-number_of_samples = 0
-for line in args.readcountstatsfile:
-    if line.startswith('#'):
-        args.outstatsfiltered.write(line)
-        continue
+def filter_paths(path, keep, column, out_path):
+    with open(path, 'r') as table, open(out_path, 'w') as table_filtered:
+        return filter_table(table, keep, column, table_filtered)
 
-    number_of_samples += 1
 
-    fields = line.split('\t')
-    count = int(fields[1])
+def filter_readcount(cutoff, stats_path, paired_path, mapping_path, out_stats_path, out_paired_path,
+                     out_mapping_path, removed_path):
+    """
+    Filter stats, pairing (2bpaired) and mapping file for samples with at least cutoff reads.
+    The stats file is read once to build the set of kept samples, the pairing and mapping file are then
+    filtered concurrently. A mapping_path of '0' means there is no mapping file.
 
-    if count >= args.cutoff:
-        good_samples.append(fields[0])
-        args.outstatsfiltered.write(line)
-    else:
-        args.filteredfiles.write(fields[0] + "\n")
+    :return: (tuple) frozenset of kept IDs and the number of samples
+    """
+    with open(stats_path, 'r') as stats, open(out_stats_path, 'w') as stats_filtered, \
+            open(removed_path, 'w') as removed:
+        good_samples, number_of_samples = filter_stats(stats, cutoff, stats_filtered, removed)
 
-# filter pairing file for good IDs
-for line in args.pairedfile:
-    if line.startswith('#'):
-        args.outpairedfiltered.write(line)
-        continue
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(filter_paths, paired_path, good_samples, 2, out_paired_path)]
+        if mapping_path != '0':
+            futures.append(executor.submit(filter_paths, mapping_path, good_samples, 0, out_mapping_path))
+        for future in futures:
+            future.result()
 
-    if line == "Forward\tReverse\tID\tfasta\n":
-        args.outpairedfiltered.write(line)
-        continue
+    return good_samples, number_of_samples
 
-    fields = line.split('\t')
-    identifier = fields[2]
 
-    if identifier in good_samples:
-        args.outpairedfiltered.write(line)
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.DEBUG
+    )
 
-# filter mapping file for good IDs
-if args.mappingfile != '0':
-    with open(args.mappingfile, 'r') as mapfile, open(args.outmappingfilefiltered, 'w') as mapfilefiltered:
-        for line in mapfile:
-            if line.startswith('#'):
-                mapfilefiltered.write(line)
-                continue
+    parser = ap.ArgumentParser()
 
-            fields = line.split('\t')
-            identifier = fields[0]
+    parser.add_argument('cutoff', type=int)
 
-            if identifier in good_samples:
-                mapfilefiltered.write(line)
+    parser.add_argument('readcountstatsfile', type=str)
+    parser.add_argument('pairedfile', type=str)
+    parser.add_argument('mappingfile', type=str)
 
+    parser.add_argument('outstatsfiltered', type=str)
+    parser.add_argument('outpairedfiltered', type=str)
+    parser.add_argument('outmappingfilefiltered', type=str)
+
+    parser.add_argument('filteredfiles', type=str)
+
+    args = parser.parse_args(argv)
+
+    good_samples, number_of_samples = filter_readcount(args.cutoff, args.readcountstatsfile, args.pairedfile,
+                                                       args.mappingfile, args.outstatsfiltered,
+                                                       args.outpairedfiltered, args.outmappingfilefiltered,
+                                                       args.filteredfiles)
+
+    logging.info(f'Readcount filter (cutoff={args.cutoff}): Kept '
+                 f'{100 * len(good_samples) / max(1, number_of_samples)}% '
+                 f'({len(good_samples)}/{number_of_samples}) samples')
 
-logging.info(f'Readcount filter (cutoff={args.cutoff}): Kept {100*len(good_samples)/number_of_samples}% ({len(good_samples)}/{number_of_samples}) samples')
 
-args.readcountstatsfile.close()
-args.outstatsfiltered.close()
-args.pairedfile.close()
-args.outpairedfiltered.close()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""Decompress .fastq.gz files on a bounded pool of worker processes.
+
+Each file is inflated with ngssdk.compression into a temporary file which is renamed when complete,
+so an interrupted run never leaves a truncated .fastq behind. Files whose decompressed sibling
+already matches sizes and CRC32s of the gzip trailers are skipped.
+"""
+
+import argparse
+import os
+import sys
+import zlib
+from multiprocessing import Pool, cpu_count
+
+from ngssdk.compression import DEFAULT_READ_SIZE, is_decompressed_version, open_decompressed
+
+
+def log_to_status_file(msg):
+    with open('/usr/local/bin/status.txt', 'w') as stat_f_h:
+        stat_f_h.write(msg)
+
+
+def decompressed_name(fname):
+    return fname[:-3] if fname.endswith(".gz") else fname + ".out"
+
+
+def gunzip(fname, remove=False):
+    """
+    Decompress a gzip file next to it via a temporary file and an atomic rename.
+    Files with a complete decompressed sibling are skipped.
+
+    :param fname: (str) gzip filename
+    :param remove: (bool) remove the gzip file afterwards, like gunzip without -k
+    :return: (tuple) fname, decompressed filename, number of written bytes (None if skipped)
+    """
+    out_fname = decompressed_name(fname)
+    written = None
+    if not is_decompressed_version(fname, out_fname):
+        temp_fname = f"{out_fname}.{os.getpid()}.tmp"
+        written = 0
+        try:
+            with open_decompressed(fname) as f, open(temp_fname, 'wb', buffering=DEFAULT_READ_SIZE) as out:
+                for data in iter(lambda: f.read(DEFAULT_READ_SIZE), b""):
+                    out.write(data)
+                    written += len(data)
+            os.replace(temp_fname, out_fname)
+        finally:
+            if os.path.exists(temp_fname):
+                os.remove(temp_fname)
+    if remove:
+        os.remove(fname)
+    return fname, out_fname, written
+
+
+def _gunzip(job):
+    fname, remove = job
+    try:
+        return gunzip(fname, remove)
+    except (OSError, EOFError, zlib.error) as e:
+        return fname, None, e
+
+
+def gunzip_files(fnames, workers=None, remove=False, status=False):
+    """
+    Decompress files in parallel and print the progress per file.
+
+    :param fnames: (list) gzip filenames
+    :param workers: (int) maximum number of worker processes, defaults to the number of cpus
+    :param remove: (bool) remove the gzip files afterwards
+    :param status: (bool) also write the progress to the status file
+    :return: (dict) gzip filename -> decompressed filename
+    :raises: (RuntimeError) if any file could not be decompressed; the others are still decompressed
+    """
+    fnames = sorted(set(fnames))
+    results = {}
+    failed = []
+    if not fnames:
+        return results
+    with Pool(max(1, min(workers or cpu_count(), len(fnames)))) as pool:
+        for done, (fname, out_fname, written) in enumerate(
+                pool.imap_unordered(_gunzip, [(fname, remove) for fname in fnames]), start=1):
+            if out_fname is None:
+                print(f"[{done}/{len(fnames)}] ERROR: Could not decompress {fname}: {written}", file=sys.stderr)
+                failed.append(fname)
+                continue
+            results[fname] = out_fname
+            if written is None:
+                print(f"[{done}/{len(fnames)}] {os.path.basename(out_fname)} is already decompressed")
+            else:
+                print(f"[{done}/{len(fnames)}] Decompressed {os.path.basename(fname)} ({written} bytes)")
+            if status:
+                log_to_status_file(f"Decompressing files ({done}/{len(fnames)})")
+            sys.stdout.flush()
+    if failed:
+        raise RuntimeError(f"Could not decompress {len(failed)} files: {', '.join(failed)}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decompress .fastq.gz files in parallel.")
+    parser.add_argument('paths', type=str, nargs='+', help="gzip files or folders with .fastq.gz files")
+    parser.add_argument('--workers', type=int, default=None, help="number of parallel decompressions")
+    parser.add_argument('--remove', action='store_true', help="remove the gzip files after decompression")
+    parser.add_argument('--status', action='store_true', help="write the progress to the status file")
+    args = parser.parse_args(argv)
+
+    fnames = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            fnames.extend(os.path.join(path, node) for node in os.listdir(path) if node.endswith(".fastq.gz"))
+        else:
+            fnames.append(path)
+
+    try:
+        gunzip_files(fnames, args.workers, args.remove, args.status)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""Make files available under a new path with as little I/O as possible.
+
+The methods are tried in the order reflink (copy-on-write clone), symlink and copy.
+The first method that works between two folders is remembered, so the filesystem capabilities
+are only probed once per pair of folders. Hardlinks are not used: they share owner and
+permissions with the source, so e.g. a chmod of the output would change the input files.
+"""
+
+import fcntl
+import os
+import shutil
+import threading
+
+# ioctl request to clone a file on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+METHODS = ("reflink", "symlink", "copy")
+
+_preferred = {}
+_lock = threading.Lock()
+
+
+def reflink(src, dst):
+    with open(src, 'rb') as src_h, open(dst, 'wb') as dst_h:
+        try:
+            fcntl.ioctl(dst_h.fileno(), FICLONE, src_h.fileno())
+        except OSError:
+            dst_h.close()
+            os.remove(dst)
+            raise
+
+
+def symlink(src, dst):
+    os.symlink(os.path.abspath(src), dst)
+
+
+def copy(src, dst):
+    shutil.copyfile(src, dst)
+
+
+_FUNCTIONS = {"reflink": reflink, "symlink": symlink, "copy": copy}
+
+
+def materialize(src, dst, methods=METHODS):
+    """
+    Make src available as dst. An existing dst is replaced.
+
+    :param src: (str) existing file
+    :param dst: (str) new path
+    :param methods: (tuple) allowed methods in order of preference
+    :return: (str) the used method
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    key = (os.path.dirname(os.path.abspath(src)), os.path.dirname(os.path.abspath(dst)))
+    with _lock:
+        preferred = _preferred.get(key)
+    candidates = list(methods)
+    if preferred in candidates:
+        candidates = candidates[candidates.index(preferred):]
+
+    for method in candidates:
+        try:
+            _FUNCTIONS[method](src, dst)
+        except OSError:
+            if method == candidates[-1]:
+                raise
+            continue
+        with _lock:
+            _preferred.setdefault(key, method)
+        return method
+
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+"""Merge the per sample fasta files of a folder into one file with usearch sample labels.
+
+Headers become '>{sample}_{n};barcodelabel={sample};size=N;'. The samples are relabeled in parallel and
+concatenated in the order of their file names.
+"""
+
+import argparse
+import sys
+
+from ngssdk.merge import merge_fasta_folder
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge and relabel the fasta files of a folder.")
+    parser.add_argument('folder', type=str, help="folder with one fasta file per sample")
+    parser.add_argument('merged', type=str, help="output for the merged fasta file")
+    parser.add_argument('--workers', type=int, default=None, help="number of parallel processes")
+    args = parser.parse_args(argv)
+
+    counts = merge_fasta_folder(args.folder, args.merged, args.workers)
+    print(f"Merged {sum(records for records, _ in counts.values())} records of {len(counts)} samples")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
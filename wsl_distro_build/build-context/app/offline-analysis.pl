@@ -210,8 +210,7 @@ if ($isPaired == 1) {
 
                 if (-e "$pathout/report.txt") {
                     print "Merging command experienced a non critical failure.\n";
-                    my $lines = `wc -l < $paired/$merged`;
-                    my $merged_number = $lines / 4;
+                    my $merged_number = countRecords("$paired/$merged", "fastq");
                     my $pairsnum = ${$samplesStats_hash{$sample}}[0];
                     print "\tMerging pairs $forward_file and $reverse_file from sample $sample... Done\n";
                     print "\t$merged_number were merged out of $pairsnum pairs.\n\n";
@@ -226,8 +225,7 @@ if ($isPaired == 1) {
                 }
             }
             else {
-                my $lines = `wc -l < $paired/$merged`;
-                my $merged_number = $lines / 4;
+                my $merged_number = countRecords("$paired/$merged", "fastq");
                 my $pairsnum = ${$samplesStats_hash{$sample}}[0];
                 print "\tMerging pairs $forward_file and $reverse_file from sample $sample... Done\n";
                 print "\t$merged_number were merged out of $pairsnum pairs.\n\n";
@@ -268,7 +266,7 @@ if ($isPaired == 1) {
             }
             else {
                 my $targetfile = "$filtered2/$fastafile";
-                my $filtered_number = `grep '^>' $targetfile | wc -l`;
+                my $filtered_number = countRecords($targetfile, "fasta");
                 chomp $filtered_number;
                 my $merged_number = ${$samplesStats_hash{$sample}}[1];
                 print "Done\n";
@@ -296,7 +294,7 @@ if ($isPaired == 1) {
             }
             else {
                 my $targetfile = "$unique/$fastafile";
-                my $unique_number = `grep '^>' $targetfile | wc -l`;
+                my $unique_number = countRecords($targetfile, "fasta");
                 chomp $unique_number; #we shall store this to file
                 my $filtered_number = ${$samplesStats_hash{$sample}}[2];
                 print "Done\n";
@@ -326,7 +324,7 @@ if ($isPaired == 1) {
             }
             else {
                 my $targetfile = "$noiseless/$fastafile";
-                my $denoised_number = `grep '^>' $targetfile | wc -l`;
+                my $denoised_number = countRecords($targetfile, "fasta");
                 chomp $denoised_number;                                  #we shall store this to file
                 my $filtered_number = ${$samplesStats_hash{$sample}}[2]; #we shall use the unique number
                 print "Done\n";
@@ -385,7 +383,7 @@ else {
             }
             else {
                 my $targetfile = "$filtered2/$fastafile";
-                my $filtered_number = `grep '^>' $targetfile | wc -l`;
+                my $filtered_number = countRecords($targetfile, "fasta");
                 chomp $filtered_number;
                 my $reads_number = ${$samplesStats_hash{$sample}}[0];
                 print "Done\n";
@@ -411,7 +409,7 @@ else {
             }
             else {
                 my $targetfile = "$unique/$fastafile";
-                my $unique_number = `grep '^>' $targetfile | wc -l`;
+                my $unique_number = countRecords($targetfile, "fasta");
                 chomp $unique_number;
                 my $filtered_number = ${$samplesStats_hash{$sample}}[1];
                 print "Done\n";
@@ -438,7 +436,7 @@ else {
             }
             else {
                 my $targetfile = "$noiseless/$fastafile";
-                my $denoised_number = `grep '^>' $targetfile | wc -l`;
+                my $denoised_number = countRecords($targetfile, "fasta");
                 chomp $denoised_number;                                  #we shall store this to file
                 my $filtered_number = ${$samplesStats_hash{$sample}}[2]; #we shall use the unique number
                 print "Done\n";
@@ -499,7 +497,7 @@ if ($doZ == 1) {
 #merging sequence files
 print ">>> Merging seqs ...";
 logToStatusFile("Merging...");
-mergeSEQfolder($pathout, "unique", $merged_filename);
+system("merge_fasta_folder.py \"$pathout/unique\" \"$pathout/$merged_filename\"") == 0 or terminate(3);
 print "Done.\n\n";
 
 #dereplicating merged paired reads  (unique)
@@ -685,21 +683,21 @@ else {
     #print @output;
 }
 
+#filter OTUs/zOTUs according to 0.25% abundance; the sample sizes before and after are counted in the same pass
+logToStatusFile("Apply abundance filtering...");
+my $sample_sizes_filename = "$pathout/otu_sample_sizes.tab";
+system("filter_otus.py \"$pathout/$otu_table_03\" \"$pathout/$otu_table_03_filtered\" \"$pathout/$filtered_otu_table_03_list\" $abundance --sample-sizes \"$sample_sizes_filename\"") == 0 or terminate(3);
+my ($unfiltered_sample_sizes_hash_ref, $filtered_sample_sizes_hash_ref) = readSampleSizes($sample_sizes_filename);
+unlink($sample_sizes_filename);
+
 # Count the samples sizes mapped to the unfiltered OTUs
-my $unfiltered_sample_sizes_hash_ref = countSampleSize("$pathout/$otu_table_03");
 foreach my $sample (keys %{$unfiltered_sample_sizes_hash_ref}) {
     if (exists $samplesStats_hash{$sample}) {
         push(@{$samplesStats_hash{$sample}}, ${$unfiltered_sample_sizes_hash_ref}{$sample});
     }
 }
 
-#filter OTUs/zOTUs according to 0.25% abundance
-logToStatusFile("Apply abundance filtering...");
-filterOTUs("$pathout/$otu_table_03", "$pathout/$otu_table_03_filtered", "$pathout/$filtered_otu_table_03_list", $abundance);
-
-
 # Count the samples sizes mapped to the filtered OTUs
-my $filtered_sample_sizes_hash_ref = countSampleSize("$pathout/$otu_table_03_filtered");
 foreach my $sample (keys %{$filtered_sample_sizes_hash_ref}) {
     if (exists $samplesStats_hash{$sample}) {
         push(@{$samplesStats_hash{$sample}}, ${$filtered_sample_sizes_hash_ref}{$sample});
@@ -730,7 +728,7 @@ if ($reference_sequence ne "16S" && $reference_sequence ne "18S") {
     $arb_file = $silva_db_arb;
 }
 system $bin_dir . "/sina --in $pathout/$nonchimeric_otus_03_filtered_filename --out $pathout/$nonchimeric_otus_03_aligned_filename --db $arb_file --search --intype=fasta --outtype=fasta --fasta-write-dna --lca-fields=tax_slv, --meta-fmt csv";
-addTax("$pathout/$otu_table_03_filtered", "$pathout/$otus_03_nonchimeric_aligned", "$pathout/$otu_table_03_final");
+system("add_taxonomy.py \"$pathout/$otu_table_03_filtered\" \"$pathout/$otus_03_nonchimeric_aligned\" \"$pathout/$otu_table_03_final\"") == 0 or terminate(3);
 print "Done.\n\n";
 
 #calculate the otus tree
@@ -967,185 +965,23 @@ sub trimsides {
     }
 }
 
-sub countSampleSize {
-    my ($otu_file_name) = @_;
-    die "Error: input otu file not specified \n" unless defined $otu_file_name;
-    open(my $otufile_fh, '<', $otu_file_name) or die "Couldnt open $otu_file_name to read from.\n";
-
-    #read first line and create an array of size the number of ellements minus 1 populated by 0
-    my $firstline = <$otufile_fh>;
-    chomp $firstline;
-    my @firstline_elements = split(/\t/, $firstline);
-    shift @firstline_elements;
-    my @sample_sizes = (0) x @firstline_elements;
+# read the sample sizes of the unfiltered and the filtered OTU table written by filter_otus.py
+sub readSampleSizes {
+    my ($sizes_file_name) = @_;
+    open(my $sizes_fh, '<', $sizes_file_name) or die "Couldnt open $sizes_file_name to read from.\n";
 
-    #read through the file and add the value of each cell to the total of each sample
-    while (my $line = <$otufile_fh>) {
+    my %unfiltered_sizes_hash = ();
+    my %filtered_sizes_hash = ();
+    while (my $line = <$sizes_fh>) {
+        next if $line =~ /^#/;
         chomp $line;
-        my @elements = split(/\t/, $line);
-        shift @elements;
-        for (my $x = 0; $x < @elements; $x++) {
-            $sample_sizes[$x] = $sample_sizes[$x] + $elements[$x];
-        }
+        my ($sample, $unfiltered_size, $filtered_size) = split(/\t/, $line);
+        $unfiltered_sizes_hash{$sample} = $unfiltered_size;
+        $filtered_sizes_hash{$sample} = $filtered_size;
     }
+    close $sizes_fh;
 
-    my %sizes_hash = ();
-    for (my $x = 0; $x < scalar @firstline_elements; $x++) {
-        $sizes_hash{$firstline_elements[$x]} = $sample_sizes[$x];
-    }
-
-    return (\%sizes_hash);
-}
-
-
-# check the relative abundance of the OTUs over the table
-# if there is no sample in which an OTU is abive the cutoff
-# the OTU is removed as unreliable. This function
-# output the filtered OTU table and a list of selected OTUs
-sub filterOTUs {
-    my ($otu_file_name, $filtered_otu_file_name, $filtered_otu_list, $cutoff) = @_;
-
-    die "Error: input otu file not specified \n" unless defined $otu_file_name;
-    die "Error: output otu file not specified \n" unless defined $filtered_otu_file_name;
-    die "Error: cutoff not specified \n" unless defined $cutoff;
-
-    open(my $otufile_fh, '<', $otu_file_name) or die "Couldnt open $otu_file_name to read from.\n";
-    open(my $output_fh, '>', $filtered_otu_file_name) or die "Couldnt open $filtered_otu_file_name to write to.\n";
-    open(my $list_fh, '>', $filtered_otu_list) or die "Couldnt open $filtered_otu_list to write to.\n";
-
-    #read first line and create an array of size the number of ellements minus 1 populated by 0
-    my $firstline = <$otufile_fh>;
-    print $output_fh $firstline;
-    chomp $firstline;
-    my @firstline_elements = split(/\t/, $firstline);
-    shift @firstline_elements;
-    my @sample_sizes = (0) x @firstline_elements;
-
-    #read through the file and add the value of each cell to the total of each sample
-    while (my $line = <$otufile_fh>) {
-        chomp $line;
-        my @elements = split(/\t/, $line);
-        shift @elements;
-        for (my $x = 0; $x < @elements; $x++) {
-            $sample_sizes[$x] = $sample_sizes[$x] + $elements[$x];
-        }
-    }
-
-    #here I should
-
-    #rewind file and read through checking for criteria
-    seek $otufile_fh, 0, 0;
-    <$otufile_fh>;
-
-    while (my $line = <$otufile_fh>) {
-        chomp $line;
-        my @elements = split(/\t/, $line);
-        my $otu_name = shift @elements;
-        my $count = 0;
-        for (my $x = 0; $x < @elements; $x++) {
-            my $abundance = $elements[$x] / $sample_sizes[$x];
-            if ($abundance > $cutoff) {
-                print $output_fh "$line\n";
-                print $list_fh "$otu_name\n";
-                last;
-            }
-        }
-    }
-}
-
-#add a taxonomy tab to the OTU table
-sub addTax {
-    my ($tablefile, $tax_class, $annotable) = @_; # OTU table, SILVA Taxonomy, Annotated OTU table
-
-    #open input and output files
-    open(my $input_fh, '<', "$tax_class") or die "Couldnt open $pathout/classified.txt to read from.\n$!";
-    open(my $output_fh, '>', "$pathout/classifiedF.txt") or die "Couldnt open $pathout/classifiedF.txt to write to.\n$!";
-
-    #format the Classifier output to our look
-    foreach my $classline (<$input_fh>) {
-        chomp $classline;
-        my @lineparts = split(/,/, $classline);
-        my $seqid = $lineparts[0];
-        my $classification = $lineparts[6];
-        $classification =~ s/"//g;          # remove quote characters
-        $classification =~ s/\[//g;         # remove "[" characters
-        $classification =~ s/\]//g;         # remove "[" characters
-        $classification =~ s/uncultured//g; # remove "uncultured" word
-        my $semi_colon_count = () = $classification =~ /;/g;
-        my $missing_semi_colons = ";" x (6 - $semi_colon_count);
-        $classification = $classification . $missing_semi_colons;
-        print $output_fh "$seqid\t$classification\n";
-    }
-    close $output_fh;
-    close $input_fh;
-
-
-    #open input and output files
-    open(my $tax_fh, '<', "$pathout/classifiedF.txt") or die "Couldnt open $pathout/classifiedF.txt to read from.\n$!";
-    open(my $otu_fh, '<', "$tablefile") or die "Couldnt open $tablefile to read from.\n$!";
-    open(my $combined_fh, '>', "$annotable") or die "Couldnt open $annotable to write to.\n$!";
-
-    #build taxonomy hash from taxfile
-    my %tax_hash;
-    while (my $taxline = <$tax_fh>) {
-        chomp $taxline;
-        my ($name, $taxonomy) = split(/\t/, $taxline);
-        $tax_hash{$name} = $taxonomy;
-    }
-    close $tax_fh;
-
-    my $firstline = <$otu_fh>;
-    chomp $firstline;
-    $firstline = "$firstline\ttaxonomy\n";
-    print $combined_fh $firstline;
-
-    while (my $otuline = <$otu_fh>) {
-        chomp $otuline;
-        my ($id) = split(/\t/, $otuline);
-        if (exists $tax_hash{$id}) {
-            $otuline = $otuline . "\t$tax_hash{$id}";
-        }
-        print $combined_fh "$otuline\n";
-    }
-    close $otu_fh;
-    close $combined_fh;
-    #unlink ("$pathout/classified.txt");
-    unlink("$pathout/classifiedF.txt");
-}
-
-#
-#
-sub mergeSEQfolder {
-    my ($path, $target_dir, $outputfile) = @_;
-
-    my $pathin = "$path/$target_dir";
-
-    open(my $outfh, '>', "$path/$outputfile") or die "Couldnt open $outputfile to write to.$!";
-
-    my @filelist = dir_list($pathin);
-    #print ("\nMerging files in folder: $target_dir ...\n");
-
-    foreach my $file (@filelist) {
-
-        if (!$file =~ /[^\.]/) {
-            next;
-        }
-
-        open(my $infh, '<', "$pathin/$file") or die "Couldnt open $file to read from.$!";
-        $file =~ /\.\w*\z/;
-        my ($sample) = split($&, $file);
-        my $count = 0;
-        while (my $line = <$infh>) {
-            if ($line =~ />/) {
-                $line =~ /(;.*;)/;
-                my $size = $1;
-                my $barcodeid = ";barcodelabel=$sample";
-                $line = ">$sample" . "_$count$barcodeid$size\n";
-                $count++;
-            }
-            print $outfh $line;
-        }
-    }
+    return (\%unfiltered_sizes_hash, \%filtered_sizes_hash);
 }
 
 ###
@@ -1237,6 +1073,30 @@ sub stdev {
     return $std;
 }
 
+#function for counting the records of a FASTX file
+sub countRecords {
+    # the counted files were just written by usearch, so a read count cache could never hit and
+    # starting a counting process per sample and stage would only add overhead; the file is counted here
+    my ($seqFileName, $format) = @_;
+    return 0 unless -e $seqFileName;
+    open(my $seqfile_fh, '<', $seqFileName) or die "Cannot open $seqFileName to read from.\n$!";
+    my $count = 0;
+    if ($format eq "fastq") {
+        local $/ = \4194304; # read blocks of 4 MiB and count their line ends
+        while (my $block = <$seqfile_fh>) {
+            $count += ($block =~ tr/\n//);
+        }
+        $count = int($count / 4);
+    }
+    else {
+        while (my $line = <$seqfile_fh>) {
+            $count++ if substr($line, 0, 1) eq ">";
+        }
+    }
+    close($seqfile_fh);
+    return $count;
+}
+
 #function for reading through a FASTX file and returning the mean and sd of the seq sizes
 sub seqFileStats {
     my ($seqFileName, $type) = @_;
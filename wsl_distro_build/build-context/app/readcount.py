@@ -7,6 +7,10 @@ import os
 import logging
 from time import sleep
 
+from readcount_cache import DEFAULT_CACHE_DIR, cached_stats
+
+FASTQ_EXTENSIONS = (".fastq", ".fastq.gz")
+
 def log_to_status_file(msg):
     with open('/usr/local/bin/status.txt', 'w') as stat_f_h:
         stat_f_h.write(msg)
@@ -18,6 +22,8 @@ parser.add_argument('statsout', type=str)
 parser.add_argument('tobepairedout', type=str)
 parser.add_argument('--mapping', type=str)
 parser.add_argument('--log-failed', type=str)
+parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                    help=f'folder of the read count cache (default: {DEFAULT_CACHE_DIR})')
 args = parser.parse_args()
 
 stats_out_path = args.statsout
@@ -84,26 +90,42 @@ def inspectFilename(fastq_filename):
     return (ID, IDFastq, this_seperator, addBackToString(fn, other_seperator))
 
 
-def file_len(fname):
+def pair_files(filenames):
     """
-    Get the number of lines in a file
+    Pair forward and reverse fastq files of a folder listing.
+    I1 and I2 files are skipped and every mate is only processed once.
+    Files may be gzip compressed; if both versions of a file exist the uncompressed one is used.
 
-    :param fname: (str) filename
-    :return: (int) Number of lines in file
+    :param filenames: (list) Names of the files in a folder
+    :return: (list) A list of tuples with ID, forward filename and reverse filename
     """
-    try:
-        with open(fname) as f:
-            for i, l in enumerate(f):
-                pass
-            return i + 1
-    except UnboundLocalError as e:
-        failedFilenames.append("EMPTY " + str(fname))
-        print(str(
-            e) + " while counting lines for file {}. This probably means this file is empty.".format(
-            fname))
-        return 0
-    except Exception as e:
-        raise
+    names = set(filenames)
+    seen = set()
+    pairs = []
+    for file in filenames:
+        # exclude I1 and I2 files
+        if "_I1_" in file or "_I2_" in file:
+            continue
+        # ignore files that were already processed from its matching partner and files that are not fastq files
+        if file in seen or not file.endswith(FASTQ_EXTENSIONS):
+            continue
+        if file.endswith(".gz") and file[:-3] in names:
+            continue
+
+        (ID, IDFastq, R, matching) = inspectFilename(file)
+        # the mate may be stored uncompressed or compressed
+        uncompressed = matching[:-3] if matching.endswith(".gz") else matching
+        for candidate in (uncompressed, uncompressed + ".gz"):
+            if candidate in names:
+                matching = candidate
+                break
+        seen.add(matching)
+
+        if R == "_R1_":
+            pairs.append((ID, file, matching))
+        else:
+            pairs.append((ID, matching, file))
+    return pairs
 
 
 def gzip(file):
@@ -115,7 +137,7 @@ logging.basicConfig(
     level=logging.DEBUG
 )
 
-mapping = []
+mapping = set()
 mapping_given = False
 if args.mapping is not None:
     mapping_given = True
@@ -124,7 +146,7 @@ if args.mapping is not None:
             if line.startswith('#'):
                 continue
             fields = line.split('\t')
-            mapping.append(fields[0])
+            mapping.add(fields[0])
 
 logging.debug(f'entries of mapping file: {mapping!r}')
 
@@ -133,102 +155,114 @@ logging.debug(f'entries of mapping file: {mapping!r}')
 stats_string_tab = ""
 tobepaired_string_tab = "#Forward\tReverse\tID\tfasta\n"
 
-ignore = []  # array of already matched files as we iterate filename by filename
 i = 0  # an iterator for processed files
 failed = 0  # an iterator counting the failed attempts to get the linecount, this means the file did not exist
 failedFilenames = []  # collecting the filenames that failed in a list
-
-# transverse a given folder
-for file in os.listdir(pathToFolder):
-    # exclude I1 and I2 files by adding them to the ignore list
-    if (len(file.split("_I1_")) != 1) or (len(file.split("_I2_")) != 1):
-        ignore.append(file)
-
-    # ignore files that were already processed from its matching partner and files that are not fastq files
-    if file not in ignore and file.endswith(".fastq"):
-        failedInThisIteration = False
-
-        (ID, IDFastq, R, matching) = inspectFilename(file)
-        ignore.append(matching)
-
-        # dont process files that are not in given mapping file
-        if mapping_given:
-            if ID not in mapping:
-                logging.warning(f'Ignoring ID {ID!r} as it is not in the given mapping file.')
-                continue
-
-        if R == "_R1_":
-            forwardFile = file
-            reverseFile = matching
-        elif R == "_R2_":
-            forwardFile = matching
-            reverseFile = file
-
-        # count lines in forward file
-        try:
-            fwCount = file_len(pathToFolder + "/" + forwardFile)
-        except FileNotFoundError:
-            fwCount = 0
-            failedInThisIteration = True
+log_fails_and_continue = bool(log_failed)
+
+# pair files of the given folder up front
+pairs = []
+for (ID, forwardFile, reverseFile) in pair_files(sorted(os.listdir(pathToFolder))):
+    # dont process files that are not in given mapping file
+    if mapping_given and ID not in mapping:
+        logging.warning(f'Ignoring ID {ID!r} as it is not in the given mapping file.')
+        continue
+    pairs.append((ID, forwardFile, reverseFile))
+
+# count lines of all forward and reverse files that are not cached in parallel
+stats = cached_stats([pathToFolder + "/" + name for (_, fw, rw) in pairs for name in (fw, rw)],
+                     cache_dir=args.cache_dir)
+counts = {os.path.basename(fname): (result['lines'] if isinstance(result, dict) else result)
+          for fname, result in stats.items()}
+
+for (ID, forwardFile, reverseFile) in pairs:
+    failedInThisIteration = False
+    fwCount = counts[forwardFile]
+    rwCount = counts[reverseFile]
+
+    # count lines in forward file
+    if fwCount is None:
+        fwCount = 0
+        failedInThisIteration = True
+        failed += 1
+        failedFilenames.append(forwardFile)
+        forwardFile = "None"
+    elif fwCount == 0:
+        failedFilenames.append("EMPTY " + pathToFolder + "/" + forwardFile)
+        print(f"No lines in file {forwardFile}. This probably means this file is empty.")
+
+    # count lines in reverse file
+    if rwCount is None:
+        rwCount = 0
+        failedInThisIteration = True
+        failed += 1
+        failedFilenames.append(reverseFile)
+        reverseFile = "None"
+    elif rwCount == 0:
+        failedFilenames.append("EMPTY " + pathToFolder + "/" + reverseFile)
+        print(f"No lines in file {reverseFile}. This probably means this file is empty.")
+
+    # compressed files that could not be read; the pair is skipped
+    corrupt = False
+    for (name, lines) in ((forwardFile, fwCount), (reverseFile, rwCount)):
+        if lines < 0:
+            corrupt = True
             failed += 1
-            failedFilenames.append(forwardFile)
-            forwardFile = "None"
-
-        # count lines in reverse file
-        try:
-            rwCount = file_len(pathToFolder + "/" + reverseFile)
-        except FileNotFoundError:
-            rwCount = 0
-            failedInThisIteration = True
-            failed += 1
-            failedFilenames.append(reverseFile)
-            reverseFile = "None"
-
-        # generate count for demultiplexing
-        # we assume that the counts are the same for rw file and fw file
-        if fwCount != rwCount:
-            print("ERROR: Counts not the same in forward and reverse for files {} and {}".format(forwardFile,
-                                                                                                 reverseFile))
+            failedFilenames.append("CORRUPT " + pathToFolder + "/" + name)
+            print(f"ERROR: Could not read compressed file {name}")
             if not log_fails_and_continue:
                 exit(1)
-            else:
-                log_to_status_file('WARNING: Readcount failed for a file. Process continues...')
-                with open(log_failed_path, 'a') as f:
-                    f.write(
-                        f"{forwardFile}\tERROR: Counts not the same in forward and reverse for files {forwardFile} and {reverseFile}\n")
+            log_to_status_file('WARNING: Readcount failed for a file. Process continues...')
+            with open(log_failed_path, 'a') as f:
+                f.write(f"{name}\tERROR: Could not read compressed file {name}\n")
+    if corrupt:
+        continue
+
+    # generate count for demultiplexing
+    # we assume that the counts are the same for rw file and fw file
+    if fwCount != rwCount:
+        print("ERROR: Counts not the same in forward and reverse for files {} and {}".format(forwardFile,
+                                                                                             reverseFile))
+        if not log_fails_and_continue:
+            exit(1)
+        else:
+            log_to_status_file('WARNING: Readcount failed for a file. Process continues...')
+            with open(log_failed_path, 'a') as f:
+                f.write(f"{forwardFile}\tERROR: Counts not the same in forward and reverse for files "
+                        f"{forwardFile} and {reverseFile}\n")
 
-        # test if the count can be divided by 4 as assumed
-        if fwCount % 4 != 0:
-            print(f"ERROR: Assumption that there are 4 lines per sample in a fastq file failed for {forwardFile}")
+    # test if the count can be divided by 4 as assumed
+    if fwCount % 4 != 0:
+        print(f"ERROR: Assumption that there are 4 lines per sample in a fastq file failed for {forwardFile}")
 
-            if not log_fails_and_continue:
-                exit(1)
-            else:
-                log_to_status_file('WARNING: Readcount failed for a file. Process continues...')
-                with open(log_failed_path, 'a') as f:
-                    f.write(
-                        f"{forwardFile}\tERROR: Assumption that there are 4 lines per sample in a fastq file failed for {forwardFile}\n")
-
-        # divide the lines in a fastq file by 4 to get the number of sequences per file
-        count = fwCount // 4
-
-        # add to the output strings
-        if not failedInThisIteration:
-            stats_string_tab += str(ID)
-            stats_string_tab += "\t"
-            stats_string_tab += str(count)
-            stats_string_tab += "\n"
-
-            tobepaired_string_tab += str(forwardFile)
-            tobepaired_string_tab += "\t"
-            tobepaired_string_tab += str(reverseFile)
-            tobepaired_string_tab += "\t"
-            tobepaired_string_tab += str(ID)
-            tobepaired_string_tab += "\t"
-            tobepaired_string_tab += str(ID + ".fasta")
-            tobepaired_string_tab += "\n"
-
-            i += 1
+        if not log_fails_and_continue:
+            exit(1)
+        else:
+            log_to_status_file('WARNING: Readcount failed for a file. Process continues...')
+            with open(log_failed_path, 'a') as f:
+                f.write(f"{forwardFile}\tERROR: Assumption that there are 4 lines per sample in a fastq file "
+                        f"failed for {forwardFile}\n")
+
+    # divide the lines in a fastq file by 4 to get the number of sequences per file
+    count = fwCount // 4
+
+    # add to the output strings
+    if not failedInThisIteration:
+        stats_string_tab += str(ID)
+        stats_string_tab += "\t"
+        stats_string_tab += str(count)
+        stats_string_tab += "\n"
+
+        tobepaired_string_tab += str(forwardFile)
+        tobepaired_string_tab += "\t"
+        tobepaired_string_tab += str(reverseFile)
+        tobepaired_string_tab += "\t"
+        tobepaired_string_tab += str(ID)
+        tobepaired_string_tab += "\t"
+        tobepaired_string_tab += str(ID + ".fasta")
+        tobepaired_string_tab += "\n"
+
+        i += 1
 
 # print some output about failed attempts
 processedFiles = i * 2
@@ -0,0 +1,246 @@
+"""Count lines and records of (gzipped) fastq and fasta files with a persistent cache.
+
+Counts are stored in a .readcount_cache.json file next to the counted files, keyed by
+file name, size and modification time in ns (and optionally a hash of sampled blocks),
+so reruns do not rescan unchanged files.  With a cache directory the counts of each
+folder are stored in a file of the cache directory named after the absolute path of
+the folder instead, so input folders are left untouched.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import zlib
+from multiprocessing import Pool, cpu_count
+
+from ngssdk.compression import open_decompressed
+
+# size of the binary reads used to count newlines
+READ_SIZE = 4 * 1024 * 1024
+
+# line counts of the files of a folder are cached in this file of the folder
+CACHE_FILENAME = ".readcount_cache.json"
+
+# cache directory that survives the timestamped output folders of the runs
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ngstoolkit", "readcount")
+
+# size and number of the blocks hashed by sampled_hash
+SAMPLE_SIZE = 64 * 1024
+SAMPLES = 3
+
+FORMATS = ("lines", "fastq", "fasta")
+
+
+def file_stats(fname):
+    """
+    Count lines and fasta headers of a (gzipped) file in one pass.
+    A last line without a trailing newline is counted as well.
+
+    :param fname: (str) filename
+    :return: (dict) with the number of 'lines' and 'headers' (lines starting with '>')
+    """
+    lines = 0
+    headers = 0
+    last = b"\n"
+    with open_decompressed(fname) as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b""):
+            lines += chunk.count(b"\n")
+            headers += chunk.count(b"\n>")
+            if last == b"\n" and chunk.startswith(b">"):
+                headers += 1
+            last = chunk[-1:]
+    if last != b"\n":
+        lines += 1
+    return {'lines': lines, 'headers': headers}
+
+
+def file_len(fname):
+    """
+    Get the number of lines in a file.
+
+    :param fname: (str) filename
+    :return: (int) Number of lines in file
+    """
+    return file_stats(fname)['lines']
+
+
+def records(stats, file_format):
+    """
+    :param stats: (dict) as returned by file_stats
+    :param file_format: (str) one of FORMATS
+    :return: (int) number of lines, fastq records (lines / 4) or fasta records (headers)
+    """
+    if file_format == "fastq":
+        return stats['lines'] // 4
+    if file_format == "fasta":
+        return stats['headers']
+    return stats['lines']
+
+
+def sampled_hash(fname):
+    """
+    Hash blocks at the start, middle and end of a file. This detects changed files with
+    unreliable modification times (e.g. on network shares) without reading the whole file.
+
+    :param fname: (str) filename
+    :return: (str) hex digest
+    """
+    size = os.path.getsize(fname)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(fname, 'rb') as f:
+        for i in range(SAMPLES):
+            f.seek(max(0, (size - SAMPLE_SIZE) * i // max(1, SAMPLES - 1)))
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def file_identity(fname, verify=False):
+    """
+    :param fname: (str) filename
+    :param verify: (bool) include a hash of sampled blocks
+    :return: (dict) size, mtime_ns and optionally hash of the file or None if it does not exist
+    """
+    try:
+        stat = os.stat(fname)
+        identity = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if verify:
+            identity['hash'] = sampled_hash(fname)
+    except FileNotFoundError:
+        return None
+    return identity
+
+
+class ReadCountCache:
+    """The cached stats of the files of one folder, stored in the folder or in cache_dir."""
+
+    def __init__(self, folder, cache_dir=None):
+        if cache_dir is None:
+            self.path = os.path.join(folder, CACHE_FILENAME)
+        else:
+            key = hashlib.blake2b(os.path.abspath(folder).encode(), digest_size=16).hexdigest()
+            self.path = os.path.join(cache_dir, f"{key}.json")
+        self.changed = False
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, name, identity):
+        """
+        :param name: (str) filename within the folder
+        :param identity: (dict) as returned by file_identity
+        :return: (dict) the cached stats or None if the file is not cached or has changed
+        """
+        entry = self.entries.get(name)
+        if not isinstance(entry, dict) or any(entry.get(key) != value for key, value in identity.items()):
+            return None
+        return entry
+
+    def set(self, name, identity, stats):
+        self.entries[name] = dict(identity, **stats)
+        self.changed = True
+
+    def save(self):
+        """Write the cache if it changed. Failures are only logged, e.g. for read only folders."""
+        if not self.changed:
+            return
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # a unique temporary file, as threads of one process may save the same cache
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(self.path), prefix=CACHE_FILENAME + ".",
+                                             suffix=".tmp", delete=False) as f:
+                temp_path = f.name
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.path)
+            temp_path = None
+            self.changed = False
+        except OSError as e:
+            logging.warning(f'Could not write readcount cache {self.path!r}: {e}')
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def count_file(fname):
+    """
+    Count lines and headers of a file in a worker process.
+
+    :param fname: (str) filename
+    :return: (dict) as returned by file_stats, None if the file does not exist or -1 if it is corrupt
+    """
+    try:
+        return file_stats(fname)
+    except FileNotFoundError:
+        return None
+    except (EOFError, zlib.error) as e:
+        print(f"{e} while counting lines for file {fname}.", file=sys.stderr)
+        return -1
+
+
+def cached_stats(fnames, processes=None, verify=False, cache_dir=None):
+    """
+    Get the stats of several files from the cache; files that are not cached are counted in parallel
+    and added to the cache.
+
+    :param fnames: (list) filenames
+    :param processes: (int) number of worker processes, defaults to the number of cpus
+    :param verify: (bool) also compare a hash of sampled blocks
+    :param cache_dir: (str) keep the cache in this folder instead of next to the files
+    :return: (dict) filename -> stats as returned by count_file
+    """
+    caches = {}
+    results = {}
+    uncounted = []
+    for fname in dict.fromkeys(fnames):
+        identity = file_identity(fname, verify)
+        if identity is None:
+            results[fname] = None
+            continue
+        folder, name = os.path.split(os.path.abspath(fname))
+        if folder not in caches:
+            caches[folder] = ReadCountCache(folder, cache_dir)
+        entry = caches[folder].get(name, identity)
+        if entry is None:
+            uncounted.append((fname, identity))
+        else:
+            results[fname] = entry
+
+    if len(uncounted) > 1 and processes != 1:
+        with Pool(min(processes or cpu_count(), len(uncounted))) as pool:
+            counts = pool.map(count_file, [fname for (fname, _) in uncounted], chunksize=1)
+    else:
+        counts = [count_file(fname) for (fname, _) in uncounted]
+
+    for (fname, identity), stats in zip(uncounted, counts):
+        results[fname] = stats
+        if isinstance(stats, dict):
+            folder, name = os.path.split(os.path.abspath(fname))
+            caches[folder].set(name, identity, stats)
+
+    for cache in caches.values():
+        cache.save()
+    return results
+
+
+def count_records(fname, file_format="fastq", verify=False, cache_dir=None):
+    """
+    Get the number of records of a single file using the cache.
+
+    :param fname: (str) filename
+    :param file_format: (str) one of FORMATS
+    :param verify: (bool) also compare a hash of sampled blocks
+    :param cache_dir: (str) keep the cache in this folder instead of next to the file
+    :return: (int) number of records
+    """
+    stats = cached_stats([fname], processes=1, verify=verify, cache_dir=cache_dir)[fname]
+    if stats is None:
+        raise FileNotFoundError(f"No such file: {fname!r}")
+    if stats == -1:
+        raise EOFError(f"Could not read compressed file {fname!r}")
+    return records(stats, file_format)
+
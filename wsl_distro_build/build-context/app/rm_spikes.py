@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 import argparse
 import collections
-import gzip
 import multiprocessing
 import os
+import re
 import shutil
 import subprocess
 import sys
-from subprocess import Popen, PIPE
-from typing import List, Dict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from subprocess import DEVNULL, Popen, PIPE
+from typing import List, Dict, Optional
+
+from gunzip_parallel import gunzip_files
+from materialize import materialize
+from readcount_cache import count_records
+
+try:
+    from ngssdk.spikes import AMBIGUOUS, LIKELY_SPIKE, NOT_SPIKE, KmerScreen, split_fastq_pair
+except ImportError:  # ngssdk or numpy not installed
+    KmerScreen = None
 
 # Development of TUM CF Microbiome/NGS
 
@@ -26,6 +36,13 @@ ap.add_argument('osamples', type=str, help='Output folder for samples')
 ap.add_argument('ospikes', type=str, help='Output folder for spikes')
 ap.add_argument('ostats', type=str, help='Output file for statistics')
 ap.add_argument('omapping', type=str, help='Output file for reduced mapping file')
+ap.add_argument('--cores', type=int, default=None,
+                help='Number of cores shared by all bowtie2 runs (default: all cores)')
+ap.add_argument('--threads', type=int, default=None,
+                help='Threads per bowtie2 run (default: split the free cores over the waiting samples)')
+ap.add_argument('--screen', choices=('off', 'prefilter', 'fast'), default='off',
+                help='k-mer pre-screen before bowtie2 runs: "prefilter" aligns only reads sharing a k-mer with the '
+                     'spikes, "fast" assigns reads by k-mers alone without bowtie2 (default: off)')
 args = ap.parse_args()
 
 spikes_ref_fa = args.ref  # fasta file for building an index and to align against; spike ins
@@ -35,6 +52,12 @@ output_folder_samples = args.osamples  # output folder for samples
 output_folder_spikes = args.ospikes  # output folder for spikes
 output_file_spikes_counts = args.ostats  # output for stats (readcount of spikes)
 output_file_reduced_mapping = args.omapping  # output for reduced mapping file
+cores = args.cores or multiprocessing.cpu_count()  # core budget of all bowtie2 runs
+screen_mode = args.screen if KmerScreen is not None else 'off'
+if args.screen != screen_mode:
+    print('ngssdk.spikes is not available, spike reads are not pre-screened', file=sys.stderr)
+screen = None  # k-mers of the spikes, built once before the samples are processed
+screened = {}  # split_fastq_pair counts of the pre-screened samples
 
 os.makedirs(output_folder_samples, mode=0o777, exist_ok=True)
 os.makedirs(output_folder_spikes, mode=0o777, exist_ok=True)
@@ -42,92 +65,234 @@ os.makedirs(output_folder_spikes, mode=0o777, exist_ok=True)
 Cmd = List[str]
 
 
-def call(cmd: Cmd) -> list:
+# lines of the bowtie2 alignment summary that count the pairs written by --al-conc
+CONCORDANT_PAIRS = re.compile(r'^\s*(\d+) \([\d.]+%\) aligned concordantly (?:exactly 1 time|>1 times)$')
+
+
+def call(cmd: Cmd) -> List[str]:
+    """
+    Run a command, discard its stdout and pass its stderr through line by line.
+
+    :return: (list) the stderr lines matching CONCORDANT_PAIRS
+    """
     print("> Executing " + " ".join(cmd))
-    process = Popen(cmd, stdout=PIPE, stderr=PIPE)
-    stdout = []
-    stderr = []
-    with process.stdout as pipe:
-        for line in iter(pipe.readline, b''):
-            output = line.decode('utf-8')
-            stdout.append(output)
+    process = Popen(cmd, stdout=DEVNULL, stderr=PIPE)
+    summary = []
     with process.stderr as pipe:
         for line in iter(pipe.readline, b''):
             output = line.decode('utf-8')
-            stderr.append(output)
-    return [stdout, stderr]
+            sys.stderr.write(output)
+            if CONCORDANT_PAIRS.match(output):
+                summary.append(output)
+    sys.stderr.flush()
+    process.wait()
+    return summary
+
+
+def concordant_pairs(summary: List[str]) -> Optional[int]:
+    """
+    :param summary: (list) lines of a bowtie2 alignment summary
+    :return: (int) number of concordantly aligned pairs or None if the summary does not contain them
+    """
+    if not summary:
+        return None
+    return sum(int(CONCORDANT_PAIRS.match(line).group(1)) for line in summary)
 
 
 FastqPair = collections.namedtuple('FastqPair', ['R1', 'R2'])
+SpikeResult = collections.namedtuple('SpikeResult', ['sample_id', 'spike_reads', 'weight', 'amount', 'mapping_fields'])
 
 
-def calc_spikes(r1_and_r2_file: FastqPair, mapping_lines, col_sample, col_weight, col_amount):
-    fastq_R1 = r1_and_r2_file.R1
-    fastq_R2 = r1_and_r2_file.R2
+def align(r1_and_r2_file: FastqPair, fastq_aligned: str, fastq_unaligned: str, threads: int = 1) -> Optional[int]:
+    """
+    Run bowtie2 to find spikes. The alignments themselves are not needed, only the pairs written by --al-conc
+    and --un-conc.
 
-    # generate names for the output
-    name_split = os.path.basename(fastq_R1).split("_")
-    orig_sample_id = name_split[0]
+    :return: (int) number of spike pairs from the alignment summary, None if it could not be parsed
+    """
+    cmd = ["bowtie2", "-p", str(threads), "-x", "/usr/local/databases/spikes/idx/spikes", "-1", r1_and_r2_file.R1,
+           "-2", r1_and_r2_file.R2, "--al-conc", fastq_aligned, "--un-conc", fastq_unaligned, "-S", os.devnull]
+    return concordant_pairs(call(cmd))
 
-    entry_line_in_mapping_file = mapping_lines[orig_sample_id]
-    weight = entry_line_in_mapping_file[col_weight].strip()
-    amount = entry_line_in_mapping_file[col_amount].strip()
 
-    if amount != "0":
+def screen_pair(r1_and_r2_file: FastqPair, fastq_aligned: str, fastq_unaligned: str) -> List[int]:
+    """
+    Split the pairs by their k-mers. Pairs without any k-mer of the spikes are written to the samples directly.
+    With screen_mode 'prefilter' the remaining pairs are written to candidate files next to fastq_aligned, with
+    'fast' likely spikes are written to fastq_aligned and ambiguous pairs to the samples.
+
+    Runs in a worker process forked after the global screen was built.
+
+    :return: (list) number of pairs per class
+    """
+    unaligned = (fastq_unaligned.replace("%", "1"), fastq_unaligned.replace("%", "2"))
+    if screen_mode == 'fast':
+        aligned = (fastq_aligned.replace("%", "1"), fastq_aligned.replace("%", "2"))
+        outputs = {NOT_SPIKE: unaligned, AMBIGUOUS: unaligned, LIKELY_SPIKE: aligned}
+    else:
+        candidates = candidate_files(fastq_aligned)
+        outputs = {NOT_SPIKE: unaligned, AMBIGUOUS: candidates, LIKELY_SPIKE: candidates}
+    return split_fastq_pair(r1_and_r2_file.R1, r1_and_r2_file.R2, screen, outputs)
+
+
+def candidate_files(fastq_aligned: str) -> FastqPair:
+    fastq_candidates = fastq_aligned.replace("_spikes_R%", "_candidates_R%")
+    return FastqPair(fastq_candidates.replace("%", "1"), fastq_candidates.replace("%", "2"))
+
+
+def align_candidates(counts: List[int], fastq_aligned: str, fastq_unaligned: str,
+                     threads: int = 1) -> Optional[int]:
+    """
+    Finish a sample split by screen_pair. In 'prefilter' mode the candidates are aligned with bowtie2 and their
+    unaligned pairs appended to the samples.
+
+    :return: (int) number of spike pairs, None if it is unknown
+    """
+    if screen_mode == 'fast':
+        return counts[LIKELY_SPIKE]
+
+    candidates = candidate_files(fastq_aligned)
+    try:
+        if counts[AMBIGUOUS] + counts[LIKELY_SPIKE] == 0:
+            for read in "12":
+                with open(fastq_aligned.replace("%", read), "w"):
+                    pass
+            return 0
+        fastq_unaligned_candidates = fastq_aligned.replace("_spikes_R%", "_candidates_unaligned_R%")
+        spike_pairs = align(candidates, fastq_aligned, fastq_unaligned_candidates, threads)
+        for read in "12":
+            unaligned_candidates = fastq_unaligned_candidates.replace("%", read)
+            with open(fastq_unaligned.replace("%", read), "ab") as out, open(unaligned_candidates, "rb") as part:
+                shutil.copyfileobj(part, out)
+            os.remove(unaligned_candidates)
+        return spike_pairs
+    finally:
+        for fname in candidates:
+            os.remove(fname)
+
+
+def screen_all(jobs: List[FastqPair], cores: int, mapping_lines, col_amount) -> Dict[FastqPair, List[int]]:
+    """
+    Screen all samples with spikes in worker processes before any bowtie2 run. The screen is pure Python and
+    NumPy, so it would hold the GIL in the scheduler threads while their reserved cores idle.
+
+    :return: (dict) counts of screen_pair per screened sample
+    """
+    spike_jobs = [pair for pair in jobs if has_spikes(pair, mapping_lines, col_amount)]
+    with ProcessPoolExecutor(max_workers=max(1, cores), mp_context=multiprocessing.get_context('fork')) as executor:
+        futures = {}
+        for pair in spike_jobs:
+            _, fastq_unaligned, fastq_aligned = output_files(pair, mapping_lines, col_amount)
+            futures[pair] = executor.submit(screen_pair, pair, fastq_aligned, fastq_unaligned)
+        counts = {pair: future.result() for pair, future in futures.items()}
+    for pair, pair_counts in counts.items():
+        print(f"> Screened {os.path.basename(pair.R1)}: {pair_counts[NOT_SPIKE]} of {sum(pair_counts)} pairs "
+              f"share no k-mer with the spikes, {pair_counts[LIKELY_SPIKE]} are likely spikes")
+    return counts
+
+
+def output_files(r1_and_r2_file: FastqPair, mapping_lines, col_amount):
+    """
+    :return: (tuple) file name of the sample without spikes, R% pattern of its samples output and of its spikes
+    """
+    name_split = os.path.basename(r1_and_r2_file.R1).split("_")
+    if has_spikes(r1_and_r2_file, mapping_lines, col_amount):
         name_split[0] += "-withoutSpikes"
 
     sample = '_'.join(name_split).replace("_R1_", "_R%_")
     fastq_unaligned = os.path.join(output_folder_samples, sample)
     fastq_aligned = os.path.join(output_folder_spikes,
-                                 os.path.basename(fastq_R1).split("_R1_")[0].split("_")[0] + "_spikes_R%.fastq"
+                                 os.path.basename(r1_and_r2_file.R1).split("_R1_")[0].split("_")[0] + "_spikes_R%.fastq"
                                  )
+    return sample, fastq_unaligned, fastq_aligned
+
+
+def calc_spikes(r1_and_r2_file: FastqPair, mapping_lines, col_sample, col_weight, col_amount, threads: int = 1):
+    fastq_R1 = r1_and_r2_file.R1
+    fastq_R2 = r1_and_r2_file.R2
+
+    orig_sample_id = os.path.basename(fastq_R1).split("_")[0]
+    entry_line_in_mapping_file = mapping_lines[orig_sample_id]
+    weight = entry_line_in_mapping_file[col_weight].strip()
+    amount = entry_line_in_mapping_file[col_amount].strip()
+
+    # generate names for the output
+    sample, fastq_unaligned, fastq_aligned = output_files(r1_and_r2_file, mapping_lines, col_amount)
 
     # check if we have a no spikes sample
+    spike_reads = None
     if amount == "0":
-        # copy files to samples and create empty files in spikes
-        shutil.copy(fastq_R1, fastq_unaligned.replace("%", "1"))
-        shutil.copy(fastq_R2, fastq_unaligned.replace("%", "2"))
+        # link (or if not possible copy) files to samples and create empty files in spikes
+        for fastq, read in ((fastq_R1, "1"), (fastq_R2, "2")):
+            target = fastq_unaligned.replace("%", read)
+            materialize(fastq, target)
         with open(fastq_aligned.replace("%", "1"), "w"):
             pass
         with open(fastq_aligned.replace("%", "2"), "w"):
             pass
+        spike_reads = 0
+    elif r1_and_r2_file in screened:
+        spike_reads = align_candidates(screened[r1_and_r2_file], fastq_aligned, fastq_unaligned, threads)
     else:
-        # run bowtie2 to find spikes
-        cmd = ["bowtie2", "-x", "/usr/local/databases/spikes/idx/spikes", "-1", fastq_R1, "-2", fastq_R2, "--al-conc", fastq_aligned, "--un-conc",
-               fastq_unaligned]
-        stdout, stderr = call(cmd)
-        # print(stdout)
-        sys.stderr.write("\n".join(stderr))
-        sys.stderr.flush()
-
-    # count reads of spikes
-    line_count = 0
-    with open(fastq_aligned.replace("%", "1"), "r") as al:
-        for _ in al:
-            line_count += 1
+        spike_reads = align(r1_and_r2_file, fastq_aligned, fastq_unaligned, threads)
 
-    new_sample_id = sample.split("_")[0]
-    with open(output_file_spikes_counts, 'a') as stats_h:
-        stats_h.write(f'{new_sample_id}\t{str(line_count // 4)}\t{str(weight)}\t{str(amount)}\n')
+    # count reads of spikes only if bowtie2 did not report them
+    if spike_reads is None:
+        spike_reads = count_records(fastq_aligned.replace("%", "1"), "lines") // 4
 
-    with open(output_file_reduced_mapping, 'a') as mapping_out_h:
-        entry_line_in_mapping_file[col_sample] = new_sample_id
-        mapping_out_h.write('\t'.join(entry_line_in_mapping_file).strip() + "\n")
+    new_sample_id = sample.split("_")[0]
+    mapping_fields = list(entry_line_in_mapping_file)
+    mapping_fields[col_sample] = new_sample_id
+    return SpikeResult(new_sample_id, spike_reads, weight, amount, mapping_fields)
 
     # os.remove(fastq_aligned.replace("%", "1"))
     # os.remove(fastq_aligned.replace("%", "2"))
 
 
-def gunzip(file: str):
-    new_filename = file.replace('.gz', '')
-    with gzip.open(file, 'rb') as f_in:
-        with open(new_filename, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-    return new_filename
+def pair_size(r1_and_r2_file: FastqPair) -> int:
+    return os.path.getsize(r1_and_r2_file.R1) + os.path.getsize(r1_and_r2_file.R2)
+
+
+def has_spikes(r1_and_r2_file: FastqPair, mapping_lines, col_amount) -> bool:
+    orig_sample_id = os.path.basename(r1_and_r2_file.R1).split("_")[0]
+    return mapping_lines[orig_sample_id][col_amount].strip() != "0"
+
+
+def run_scheduled(jobs: List[FastqPair], cores: int, threads, mapping_lines, col_sample, col_weight, col_amount):
+    """
+    Run calc_spikes for all jobs in the given order within a budget of cores.
+    Each bowtie2 run gets `threads` cores or, if not given, the free cores split over the waiting jobs, so
+    many samples run single threaded side by side and the last samples use the cores freed by finished ones.
+    Samples without spikes are only copied and get one core.
+
+    :return: (list) results of calc_spikes in the order of jobs
+    """
+    waiting = collections.deque(enumerate(jobs))
+    results = [None] * len(jobs)
+    running = {}
+    free = cores
+    with ThreadPoolExecutor(max_workers=max(1, cores)) as executor:
+        while waiting or running:
+            while waiting and free > 0:
+                index, filepair = waiting.popleft()
+                if not has_spikes(filepair, mapping_lines, col_amount):
+                    job_threads = 1
+                else:
+                    job_threads = min(free, threads or max(1, free // (len(waiting) + 1)))
+                future = executor.submit(calc_spikes, filepair, mapping_lines, col_sample, col_weight, col_amount,
+                                         job_threads)
+                running[future] = (index, job_threads)
+                free -= job_threads
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, job_threads = running.pop(future)
+                free += job_threads
+                results[index] = future.result()
+    return results
 
 
 def onexit():
-    # correct rights of output folders
+    # correct rights of output folders; chmod -R does not follow the symlinks to input files
     subprocess.call(['chmod', '777', '-R', os.path.abspath(output_folder_samples)])
     subprocess.call(['chmod', '777', '-R', os.path.abspath(output_folder_spikes)])
 
@@ -185,9 +350,8 @@ with open(mapping_file, 'r') as mapping_file_h:
         try:
             float(total_weight_in_g)
         except ValueError as e:
-            print(
-                f'Weight {total_weight_in_g!r} is not a valid floating point number for {sample_id!r}. Weigth will be processed as NAN.',
-                file=sys.stderr)
+            print(f'Weight {total_weight_in_g!r} is not a valid floating point number for {sample_id!r}. '
+                  f'Weigth will be processed as NAN.', file=sys.stderr)
             fields[index_of_weight_col] = "NAN"
 
         # if amount cannot be parsed to float change to 0
@@ -205,17 +369,12 @@ with open(mapping_file, 'r') as mapping_file_h:
 #print(call(cmd))
 
 log_to_status_file('Detecting spike sequences and writing filtered mapping file')
-# write stats and reduced mapping header.
-with open(output_file_spikes_counts, 'w') as stats_h:
-    stats_h.write(f'#SampleID\tSpikeReads\tspikes_total_weight_in_g\tamount_spike\n')
-
 with open(mapping_file, 'r') as mapping_file_h:
-    header: str = next(mapping_file_h)
-    assert (header.startswith('#'))
-    with open(output_file_reduced_mapping, 'w') as mapping_out_h:
-        mapping_out_h.write(header)
+    mapping_header: str = next(mapping_file_h)
+    assert (mapping_header.startswith('#'))
 
 files_to_process = set()
+files_to_decompress = set()
 for file in os.listdir(input_folder):
     if file.endswith(".fastq.gz"):
         sample_name, s1, l001, read, filenameend = file.split('_')
@@ -223,14 +382,16 @@ for file in os.listdir(input_folder):
             continue
         expected_paired_filename = f'{sample_name}_{s1}_{l001}_{"R1" if read == "R2" else "R2"}_{filenameend}'
         if not os.path.exists(os.path.join(input_folder, expected_paired_filename)):
-            print(
-                f'Paired file to {file} does not exist. Expected the file to be named {expected_paired_filename}. Ignoring pair...')
+            print(f'Paired file to {file} does not exist. '
+                  f'Expected the file to be named {expected_paired_filename}. Ignoring pair...')
             continue
-        if file.endswith(".gz") and not os.path.exists(os.path.join(input_folder, file.replace('.gz', ''))):
-            file = gunzip(os.path.join(input_folder, file))
-        if expected_paired_filename.endswith(".gz") and not os.path.exists(
-                os.path.join(input_folder, expected_paired_filename.replace('.gz', ''))):
-            expected_paired_filename = gunzip(os.path.join(input_folder, expected_paired_filename))
+        files_to_decompress.add(os.path.join(input_folder, file))
+        files_to_decompress.add(os.path.join(input_folder, expected_paired_filename))
+
+# decompress in parallel; complete decompressed versions are kept
+log_to_status_file('Decompressing files for spike removal')
+gunzip_files(files_to_decompress)
+log_to_status_file('Detecting spike sequences')
 
 for file in os.listdir(input_folder):
     if file.endswith(".fastq"):
@@ -246,13 +407,28 @@ for file in os.listdir(input_folder):
             files_to_process.add(FastqPair(os.path.join(input_folder, file),
                                            os.path.join(input_folder, expected_paired_filename)))
 
-# calculate spikes on multiple cpu cores
-pool = multiprocessing.Pool(processes=multiprocessing.cpu_count())
-child_processes = [
-    pool.apply_async(calc_spikes,
-                     (filepair, mapping_lines, index_of_sample_id_col, index_of_weight_col, index_of_amounts_col)) for
-    filepair in
-    files_to_process]
-print([res.get() for res in child_processes])
+# the k-mers of the spikes are shared by all samples
+if screen_mode != 'off' and any(has_spikes(pair, mapping_lines, index_of_amounts_col) for pair in files_to_process):
+    screen = KmerScreen.from_fasta(spikes_ref_fa)
+    print(f'Screening with {len(screen)} spike k-mers ({screen_mode})')
+
+# calculate spikes on multiple cpu cores; the largest samples are started first
+jobs = sorted(files_to_process, key=lambda pair: (-pair_size(pair), pair.R1))
+if screen is not None:
+    screened = screen_all(jobs, cores, mapping_lines, index_of_amounts_col)
+results = run_scheduled(jobs, cores, args.threads, mapping_lines, index_of_sample_id_col, index_of_weight_col,
+                        index_of_amounts_col)
+
+# write stats and reduced mapping file at once, sorted by sample
+results.sort(key=lambda result: result.sample_id)
+with open(output_file_spikes_counts, 'w') as stats_h:
+    stats_h.write(f'#SampleID\tSpikeReads\tspikes_total_weight_in_g\tamount_spike\n' +
+                  ''.join(f'{result.sample_id}\t{result.spike_reads}\t{result.weight}\t{result.amount}\n'
+                          for result in results))
+
+with open(output_file_reduced_mapping, 'w') as mapping_out_h:
+    mapping_out_h.write(mapping_header +
+                        ''.join('\t'.join(result.mapping_fields).strip() + "\n" for result in results))
+print(f'Processed {len(results)} samples')
 
 onexit()
@@ -8,6 +8,7 @@ import subprocess
 
 import math
 import statistics
+import numpy as np
 import pandas as pd
 
 
@@ -21,6 +22,8 @@ log_to_status_file('Normalize OTU table for spike reads and weights')
 parser = argparse.ArgumentParser()
 parser.add_argument("otu_table_path", help="Path of original OTU Table. Output will be written to same folder", type=str)
 parser.add_argument("spikes_stats_path", help="Path to spike stats file.", type=str)
+parser.add_argument("--float32", action="store_true",
+                    help="Normalize in single precision to halve the memory of large tables.")
 args = parser.parse_args()
 
 otu_table_path = args.otu_table_path
@@ -61,29 +64,51 @@ for values in samples.values():
 mean = (sum / n)
 logging.debug(f'mean={mean}')
 
-
+if len(observed_weights) == 0:
+    fallback_weight = 1  # fallback to 1
+else:
+    fallback_weight = statistics.median(observed_weights)  # fallback to median weight
+
+
+def normalize(otu_table, samples, mean, fallback_weight, dtype=np.float64):
+    """
+    Normalize the sample columns of an OTU table in place with one multiplication of the whole matrix.
+    Samples with spikes are scaled by mean / (count * weight * 600 / (amount * 100)), samples without spikes
+    (amount or count 0) to a total of 10000. Columns without stats are kept as they are.
+
+    :param otu_table: (DataFrame) OTU table with one column per sample
+    :param samples: (dict) sample ID -> (spike reads, weight, amount)
+    :param mean: (float) mean spike reads of the samples with spikes
+    :param fallback_weight: (float) weight of samples with a NAN weight
+    :param dtype: numpy dtype of the normalized values
+    :return: (list) sample IDs without column in the OTU table
+    """
+    columns = [file_id for file_id in otu_table.columns if file_id in samples]
+    missing = [file_id for file_id in samples if file_id not in otu_table.columns]
+    if not columns:
+        return missing
+    stats = np.array([samples[file_id] for file_id in columns], dtype=np.float64).reshape(-1, 3)
+    count, weight, amount = stats.T
+    weight[np.isnan(weight)] = fallback_weight
+    no_spikes = (amount == 0) | (count == 0)
+
+    values = otu_table[columns].values.astype(dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # normalize samples without spikes to 10_000, the others by spikes
+        scale = np.where(no_spikes,
+                         10000 / values.sum(axis=0, dtype=np.float64),
+                         mean / (count * weight * (600 / (amount * 100)))).astype(dtype)
+    values *= scale
+    # assigning a frame keeps the dtype of the normalized values
+    otu_table[columns] = pd.DataFrame(values, index=otu_table.index, columns=columns)
+    return missing
+
+
+dtype = np.float32 if args.float32 else np.float64
 otu_table = pd.read_csv(otu_table_path, delimiter="\t", index_col=0)
-print(otu_table)
-for file_id, values in samples.items():
-    count, weight, amount = values
-    thismean = mean
-    factor = None
-    try:
-        if amount == 0 or count == 0:  # no spike sample
-            # normalize to 10_000
-            row_sum = otu_table[file_id].sum()
-            otu_table[file_id] = otu_table[file_id] * (10000 / row_sum)
-        else:
-            # do spike normalization
-            if math.isnan(weight):
-                if len(observed_weights) == 0:
-                    weight = 1  # fallback to 1
-                else:
-                    weight = statistics.median(observed_weights)  # fallback to median weight
-            factor = 600 / (amount * 100)
-            otu_table[file_id] = (otu_table[file_id] * thismean) / (count * weight * factor)
-    except KeyError:
-        print(f"{file_id} is in mapping file but not in OTU Table")
+print(f'Normalizing {otu_table.shape[1]} samples with {otu_table.shape[0]} OTUs')
+for file_id in normalize(otu_table, samples, mean, fallback_weight, dtype):
+    print(f"{file_id} is in mapping file but not in OTU Table")
 
 
 normalized_otu_path = os.path.join(os.path.dirname(otu_table_path), "SpikeNormalized-OTUs-Table.tab")
@@ -1,9 +1,24 @@
 import os
 import pathlib
+import shutil
 
 from wiesel.wsl_distributions import Dockerfile, DistributionTarFile
 
 
+def stage_ngssdk():
+    """
+    Copy the ngssdk package into the build context, so the WSL scripts can use it.
+    Tests and caches are left out.
+
+    :return: path of the staged package
+    """
+    source = os.path.join(pathlib.Path(__file__).parent.parent.absolute(), "ngssdk")
+    target = os.path.join(pathlib.Path(__file__).parent.absolute(), "build-context", "app", "ngssdk")
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.copytree(source, target, ignore=shutil.ignore_patterns("test_*.py", "__pycache__"))
+    return target
+
+
 def build_ngstoolkit_wsl_distro(distro_name: str, ngstoolkit_version: str):
     """
     Build the ngstoolkit WSL distribution.
@@ -13,6 +28,7 @@ def build_ngstoolkit_wsl_distro(distro_name: str, ngstoolkit_version: str):
     :param ngstoolkit_version: version number that will be saved in /usr/local/bin/wsl_distro_version.txt
     :return:
     """
+    stage_ngssdk()
 
     distro_from_dockerfile = Dockerfile(
         dockerfile_path=os.path.join(pathlib.Path(__file__).parent.absolute(), "build-context", "Dockerfile"),
@@ -29,6 +45,8 @@ def build_ngstoolkit_wsl_distro(distro_name: str, ngstoolkit_version: str):
 
 
 def export(distro_name: str, ngstoolkit_version: str, remove_image: bool = False):
+    stage_ngssdk()
+
     distro_from_dockerfile = Dockerfile(
         dockerfile_path=os.path.join(pathlib.Path(__file__).parent.absolute(), "build-context", "Dockerfile"),
         docker_context_path=os.path.join(pathlib.Path(__file__).parent.absolute(), "build-context"),